@@ -1,14 +1,19 @@
+import csv
+import json
+import multiprocessing
+import os
+import pickle
+import queue
+import re
+import shutil
+import threading
+import time
+import uuid
 import numpy as np
-import yfinance as yf
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import LSTM, Dense
-from tensorflow.keras.applications.mobilenet_v2 import MobileNetV2, preprocess_input, decode_predictions
-from tensorflow.keras.preprocessing import image
-from sklearn.linear_model import LinearRegression
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import MinMaxScaler
+from collections import OrderedDict
+from datetime import date, timedelta
 from io import BytesIO
 from PIL import Image
 from flask import Flask, request, jsonify, render_template
@@ -16,35 +21,584 @@ from flask import Flask, request, jsonify, render_template
 app = Flask(__name__)
 CORS(app)
 
+# TensorFlow/Keras, scikit-learn and yfinance are imported inside the functions
+# that use them, so importing this module (and serving only one of the two
+# experiments) does not pay for loading all of them up front.
+
 # --- EXPERIMENT 1: CLASSIFICATION ---
-model_cnn = MobileNetV2(weights='imagenet')
+model_cnn = None  # built on first use by get_model_cnn()
+model_lock = threading.Lock()
+model_state = {'loaded': False, 'warm': False, 'error': None}
+
+# Run one dummy inference in the background when the server starts, so the
+# first real /classify request does not pay for model construction and graph
+# tracing. Set CLASSIFIER_WARMUP=0 to skip it (e.g. a forecast-only server).
+# Importing the module never warms up; under a WSGI server call start_warm_up()
+# from the worker's post-fork hook.
+app.config['CLASSIFIER_WARMUP'] = (os.environ.get('CLASSIFIER_WARMUP', '1').lower()
+                                   not in ('0', 'false', 'no'))
+
+# Micro-batching: concurrent /classify requests are queued for a few ms and
+# scored together in one model_cnn.predict call.
+app.config['CLASSIFY_MAX_BATCH'] = 16      # max images per predict call
+app.config['CLASSIFY_MAX_WAIT_MS'] = 5     # how long to wait for a batch to fill
+app.config['CLASSIFY_MAX_FILES'] = 32      # images accepted in one /classify request
+app.config['CLASSIFY_MAX_TOP_K'] = 5       # largest 'top' a caller may ask for
+
+def get_model_cnn():
+    global model_cnn
+    if model_cnn is None:
+        with model_lock:
+            if model_cnn is None:
+                from tensorflow.keras.applications.mobilenet_v2 import MobileNetV2
+                model_cnn = MobileNetV2(weights='imagenet')
+                model_state['loaded'] = True
+    return model_cnn
+
+def warm_up():
+    """Build the classifier and push one blank image through it."""
+    try:
+        from tensorflow.keras.applications.mobilenet_v2 import decode_predictions
+        started = time.perf_counter()
+        preds = get_model_cnn().predict(np.zeros((1, 224, 224, 3), dtype=np.float32), verbose=0)
+        decode_predictions(preds, top=1)
+        model_state['warm'] = True
+        model_state['warmup_seconds'] = round(time.perf_counter() - started, 3)
+    except Exception as e:
+        model_state['error'] = str(e)
+
+def start_warm_up():
+    threading.Thread(target=warm_up, daemon=True).start()
+
+def prepare_batch(blobs):
+    """Decode image uploads straight into one float32 (n, 224, 224, 3) model batch.
+
+    JPEGs are decoded at a reduced DCT scale (Image.draft) close to 224x224, so
+    large photos skip most of the full-resolution decode. Pixels are written
+    into a preallocated buffer and scaled to [-1, 1] in place, which is what
+    MobileNetV2's preprocess_input does.
+    """
+    batch = np.empty((len(blobs), 224, 224, 3), dtype=np.float32)
+    for i, img_bytes in enumerate(blobs):
+        img = Image.open(BytesIO(img_bytes))
+        img.draft('RGB', (224, 224))
+        batch[i] = np.asarray(img.convert('RGB').resize((224, 224)))
+    batch /= 127.5
+    batch -= 1.0
+    return batch
+
+class MicroBatcher:
+    """Collects image requests and runs them through the model in batches."""
+
+    def __init__(self, predict_fn, max_batch=16, max_wait_ms=5, top=5):
+        self.predict_fn = predict_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.top = top
+        self.queue = queue.Queue()
+        self.carry = None  # job that did not fit into the previous batch
+        self.lock = threading.Lock()
+        self.stats = {'batches': 0, 'items': 0, 'max_batch_seen': 0,
+                      'total_wait_ms': 0.0, 'max_wait_ms': 0.0,
+                      'batch_sizes': {}}
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def submit(self, img_array):
+        """Queue a preprocessed (n, 224, 224, 3) array and block for its n results.
+
+        The n images of one call always go through the same predict call.
+        """
+        done = threading.Event()
+        job = {'x': img_array, 'enqueued': time.perf_counter(), 'done': done,
+               'result': None, 'error': None}
+        self.queue.put(job)
+        done.wait()
+        if job['error'] is not None:
+            raise job['error']
+        return job['result']
+
+    def _collect(self):
+        first, self.carry = (self.carry or self.queue.get()), None
+        batch, size = [first], len(first['x'])
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                job = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if size + len(job['x']) > self.max_batch:
+                self.carry = job
+                break
+            batch.append(job)
+            size += len(job['x'])
+        return batch
 
-def prepare_image(img_bytes):
-    img = Image.open(BytesIO(img_bytes)).resize((224, 224))
-    img_array = image.img_to_array(img)
-    img_array = np.expand_dims(img_array, axis=0)
-    return preprocess_input(img_array)
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            try:
+                from tensorflow.keras.applications.mobilenet_v2 import decode_predictions
+                preds = self.predict_fn(np.concatenate([job['x'] for job in batch], axis=0))
+                decoded = decode_predictions(preds, top=self.top)
+                offset = 0
+                for job in batch:
+                    job['result'] = decoded[offset:offset + len(job['x'])]
+                    offset += len(job['x'])
+            except Exception as e:
+                for job in batch:
+                    job['error'] = e
+            self._record(batch, started)
+            for job in batch:
+                job['done'].set()
+
+    def _record(self, batch, started):
+        waits = [(started - job['enqueued']) * 1000 for job in batch]
+        size = sum(len(job['x']) for job in batch)
+        with self.lock:
+            s = self.stats
+            s['batches'] += 1
+            s['items'] += size
+            s['max_batch_seen'] = max(s['max_batch_seen'], size)
+            s['total_wait_ms'] += sum(w * len(job['x']) for w, job in zip(waits, batch))
+            s['max_wait_ms'] = max(s['max_wait_ms'], max(waits))
+            s['batch_sizes'][size] = s['batch_sizes'].get(size, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            s = dict(self.stats, batch_sizes=dict(self.stats['batch_sizes']))
+        s['avg_batch_size'] = round(s['items'] / s['batches'], 2) if s['batches'] else 0
+        s['avg_wait_ms'] = round(s['total_wait_ms'] / s['items'], 3) if s['items'] else 0
+        s['queue_depth'] = self.queue.qsize()
+        s['max_batch'] = self.max_batch
+        s['max_wait_ms_setting'] = self.max_wait * 1000
+        return s
+
+classifier = MicroBatcher(lambda x: get_model_cnn().predict(x, verbose=0),
+                          max_batch=app.config['CLASSIFY_MAX_BATCH'],
+                          max_wait_ms=app.config['CLASSIFY_MAX_WAIT_MS'],
+                          top=app.config['CLASSIFY_MAX_TOP_K'])
 
 @app.route('/classify', methods=['POST'])
 def classify_image():
-    if 'file' not in request.files: return jsonify({'error': 'No file'}), 400
-    file = request.files['file']
-    preds = model_cnn.predict(prepare_image(file.read()))
-    results = decode_predictions(preds, top=1)[0]
-    return jsonify({'label': results[0][1], 'confidence': f"{results[0][2]*100:.2f}%"})
+    # Several images may be sent in one multipart request under 'file'/'files'.
+    files = request.files.getlist('file') + request.files.getlist('files')
+    if not files: return jsonify({'error': 'No file'}), 400
+    if len(files) > app.config['CLASSIFY_MAX_FILES']:
+        return jsonify({'error': f"At most {app.config['CLASSIFY_MAX_FILES']} files per request"}), 400
+    try:
+        top_k = min(max(int(request.form.get('top', 1)), 1), app.config['CLASSIFY_MAX_TOP_K'])
+    except ValueError:
+        return jsonify({'error': 'top must be an integer'}), 400
+
+    try:
+        batch = prepare_batch([f.read() for f in files])
+    except Exception as e:
+        return jsonify({'error': f'Could not read image: {e}'}), 400
+    decoded = classifier.submit(batch)
+    model_state['warm'] = True
+
+    results = [{'filename': f.filename,
+                'predictions': [{'label': label, 'confidence': f"{score*100:.2f}%"}
+                                for _, label, score in preds[:top_k]]}
+               for f, preds in zip(files, decoded)]
+    response = {'results': results}
+    if len(files) == 1:
+        # Keep the original single-image fields for the existing frontend.
+        response.update(results[0]['predictions'][0])
+    return jsonify(response)
+
+@app.route('/classify/stats', methods=['GET'])
+def classify_stats():
+    return jsonify(classifier.snapshot())
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 200 once the classifier has been loaded and warmed."""
+    status = dict(model_state)
+    return jsonify(status), (200 if status['warm'] else 503)
 
 # --- EXPERIMENT 2: REGRESSION (Linear + LSTM) ---
+
+# Daily bars are cached on disk per ticker as two aligned NumPy columns
+# (dates, close in one prices.npz) plus a small meta.json. A request only downloads the
+# bars after the last cached day and merges them in.
+app.config['PRICE_CACHE_DIR'] = 'price_cache'
+app.config['PRICE_HISTORY_DAYS'] = 730          # window served to the models (~2y)
+app.config['PRICE_REFRESH_SECONDS'] = 6 * 3600  # re-check the tail after this long
+app.config['PRICE_CACHE_MAX_AGE_DAYS'] = 30     # drop entries not refreshed for this long
+app.config['PRICE_FETCHER'] = 'yahoo'           # 'yahoo' or 'csv'
+app.config['PRICE_CSV_DIR'] = 'price_fixtures'  # <TICKER>.csv files with Date,Close columns
+
+class YahooFetcher:
+    """Downloads daily closes from Yahoo Finance."""
+
+    def fetch(self, ticker, start):
+        import yfinance as yf
+        stock = yf.download(ticker, start=start.isoformat(), interval='1d', progress=False)
+        if stock.empty:
+            return np.array([], dtype='datetime64[D]'), np.array([], dtype=np.float64)
+        dates = stock.index.values.astype('datetime64[D]')
+        closes = np.asarray(stock['Close'], dtype=np.float64).reshape(-1)
+        return dates, closes
+
+class CSVFetcher:
+    """Reads daily closes from local <TICKER>.csv files (tests / offline runs)."""
+
+    def __init__(self, folder):
+        self.folder = folder
+
+    def fetch(self, ticker, start):
+        path = os.path.join(self.folder, f"{ticker.upper()}.csv")
+        dates, closes = [], []
+        if os.path.exists(path):
+            with open(path, newline='') as f:
+                for row in csv.DictReader(f):
+                    day = np.datetime64(row['Date'][:10], 'D')
+                    if day >= np.datetime64(start, 'D'):
+                        dates.append(day)
+                        closes.append(float(row['Close']))
+        return np.array(dates, dtype='datetime64[D]'), np.array(closes, dtype=np.float64)
+
+def temp_path(folder, name):
+    """A temp file name next to `name` that no other thread or process uses."""
+    root, ext = os.path.splitext(name)
+    return os.path.join(folder, f'{root}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp{ext}')
+
+def write_json(path, data):
+    tmp = temp_path(os.path.dirname(path), os.path.basename(path))
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+class PriceCache:
+    """Per-ticker columnar cache of daily closes with incremental tail refresh."""
+
+    def __init__(self, folder, fetcher, history_days=730, refresh_seconds=6 * 3600,
+                 max_age_days=30):
+        self.folder = folder
+        self.fetcher = fetcher
+        self.history_days = history_days
+        self.refresh_seconds = refresh_seconds
+        self.max_age = max_age_days * 86400
+        self.lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def _dir(self, ticker):
+        return os.path.join(self.folder, ticker.upper())
+
+    def _meta(self, ticker):
+        try:
+            with open(os.path.join(self._dir(ticker), 'meta.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _columns(self, ticker):
+        """(dates, closes) from the ticker's prices.npz, or None if unreadable."""
+        try:
+            with np.load(os.path.join(self._dir(ticker), 'prices.npz')) as data:
+                return data['dates'], data['close']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _save(self, ticker, dates, closes):
+        folder = self._dir(ticker)
+        os.makedirs(folder, exist_ok=True)
+        # Both columns go into one file that is swapped in with a single rename,
+        # so no reader (thread or forecast worker process) sees a mismatched
+        # pair. Temp names are per process since workers share this folder.
+        tmp = temp_path(folder, 'prices.npz')
+        with open(tmp, 'wb') as f:
+            np.savez(f, dates=dates, close=closes)
+        os.replace(tmp, os.path.join(folder, 'prices.npz'))
+        write_json(os.path.join(folder, 'meta.json'),
+                   {'fetched_at': time.time(), 'rows': int(len(dates))})
+
+    def get(self, ticker):
+        """Return (dates, closes) for the last history_days of `ticker`."""
+        ticker = ticker.upper()
+        window_start = date.today() - timedelta(days=self.history_days)
+        with self.lock:
+            meta = self._meta(ticker)
+            columns = self._columns(ticker) if meta else None
+            age = time.time() - meta['fetched_at'] if meta else None
+            if columns is None or age > self.max_age or meta['rows'] == 0:
+                dates, closes = self.fetcher.fetch(ticker, window_start)
+                if len(dates):
+                    self._save(ticker, dates, closes)
+            elif age > self.refresh_seconds:
+                old_dates, old_closes = columns
+                # Re-fetch from the last cached day: its bar may have been partial.
+                new_dates, new_closes = self.fetcher.fetch(ticker, old_dates[-1].astype(object))
+                keep = old_dates < (new_dates[0] if len(new_dates) else old_dates[-1] + 1)
+                dates = np.concatenate([old_dates[keep], new_dates])
+                closes = np.concatenate([old_closes[keep], new_closes])
+                # Trim history that has fallen out of the window.
+                in_window = dates >= np.datetime64(window_start, 'D')
+                dates, closes = dates[in_window], closes[in_window]
+                self._save(ticker, dates, closes)
+            else:
+                dates, closes = columns
+        in_window = dates >= np.datetime64(window_start, 'D')
+        return dates[in_window], closes[in_window]
+
+    def expire(self):
+        """Delete entries that have not been refreshed within max_age."""
+        removed = []
+        with self.lock:
+            for ticker in os.listdir(self.folder):
+                meta = self._meta(ticker)
+                if meta is None or time.time() - meta['fetched_at'] > self.max_age:
+                    shutil.rmtree(self._dir(ticker), ignore_errors=True)
+                    removed.append(ticker)
+        return removed
+
+def make_fetcher():
+    if app.config['PRICE_FETCHER'] == 'csv':
+        return CSVFetcher(app.config['PRICE_CSV_DIR'])
+    return YahooFetcher()
+
+price_cache = PriceCache(app.config['PRICE_CACHE_DIR'], make_fetcher(),
+                         history_days=app.config['PRICE_HISTORY_DAYS'],
+                         refresh_seconds=app.config['PRICE_REFRESH_SECONDS'],
+                         max_age_days=app.config['PRICE_CACHE_MAX_AGE_DAYS'])
+
+@app.route('/price_cache/expire', methods=['POST'])
+def expire_price_cache():
+    return jsonify({'removed': price_cache.expire()})
+
+# Trained LSTMs are kept in a registry keyed by ticker and hyperparameters.
+# Weights and the fitted MinMaxScaler are saved to disk; when new bars arrive
+# the saved model is fine-tuned on just those bars instead of retrained.
+app.config['MODEL_REGISTRY_DIR'] = 'model_registry'
+app.config['MODEL_REGISTRY_MAX_LOADED'] = 8    # models kept in memory (LRU)
+app.config['MODEL_REGISTRY_MAX_ON_DISK'] = 50  # saved models kept on disk (LRU)
+app.config['MODEL_FINETUNE_EPOCHS'] = 1        # passes over the new bars
+app.config['MODEL_RETRAIN_DRIFT'] = 0.10       # retrain if prices leave the scaler range by >10%
+# Bounds on client-supplied LSTM hyperparameters; requests outside them get a 400.
+app.config['FORECAST_LOOK_BACK_RANGE'] = (5, 250)
+app.config['FORECAST_UNITS_RANGE'] = (1, 256)
+app.config['FORECAST_EPOCHS_RANGE'] = (1, 50)
+app.config['FORECAST_BATCH_MAX_TICKERS'] = 10  # /predict_stock_batch trains in the request thread
+
+def make_windows(scaled_data, look_back):
+    """Turn a (n, 1) scaled series into LSTM samples [samples, time steps, features].
+
+    The windows are a strided view over `scaled_data`, so no per-window copies
+    are made (the result is read-only).
+    """
+    series = scaled_data[:, 0]
+    X_lstm = np.lib.stride_tricks.sliding_window_view(series[:-1], look_back)
+    y_lstm = series[look_back:]
+    return X_lstm[:, :, np.newaxis], y_lstm
+
+def build_lstm(look_back, units):
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import LSTM, Dense
+    model = Sequential()
+    model.add(LSTM(units=units, return_sequences=False, input_shape=(look_back, 1)))
+    model.add(Dense(1))
+    model.compile(optimizer='adam', loss='mean_squared_error')
+    return model
+
+class ModelRegistry:
+    """Disk-backed LRU registry of trained (LSTM, scaler) pairs."""
+
+    def __init__(self, folder, max_loaded=8, max_on_disk=50, finetune_epochs=1,
+                 retrain_drift=0.10):
+        self.folder = folder
+        self.max_loaded = max_loaded
+        self.max_on_disk = max_on_disk
+        self.finetune_epochs = finetune_epochs
+        self.retrain_drift = retrain_drift
+        self.loaded = OrderedDict()  # key -> {'model', 'scaler', 'meta'}
+        self.lock = threading.Lock()
+        self.key_locks = {}
+        os.makedirs(folder, exist_ok=True)
+
+    @staticmethod
+    def key(ticker, look_back, units, epochs):
+        return f"{ticker.upper()}_lb{look_back}_u{units}_e{epochs}"
+
+    def _key_lock(self, key):
+        with self.lock:
+            return self.key_locks.setdefault(key, threading.Lock())
+
+    def _remember(self, key, entry):
+        with self.lock:
+            self.loaded[key] = entry
+            self.loaded.move_to_end(key)
+            while len(self.loaded) > self.max_loaded:
+                self.loaded.popitem(last=False)
+
+    def _load(self, key):
+        folder = os.path.join(self.folder, key)
+        try:
+            with open(os.path.join(folder, 'meta.json')) as f:
+                meta = json.load(f)
+            with open(os.path.join(folder, 'scaler.pkl'), 'rb') as f:
+                scaler = pickle.load(f)
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+            return None
+        from tensorflow.keras.models import load_model
+        try:
+            model = load_model(os.path.join(folder, 'model.keras'))
+        except Exception:
+            # Missing or unreadable (e.g. evicted meanwhile): the caller retrains.
+            return None
+        return {'model': model, 'scaler': scaler, 'meta': meta}
+
+    def _save(self, key, entry):
+        # Other processes (forecast workers, the server) may save the same key:
+        # write under private temp names and swap each file in atomically.
+        folder = os.path.join(self.folder, key)
+        os.makedirs(folder, exist_ok=True)
+        tmp = temp_path(folder, 'model.keras')
+        entry['model'].save(tmp)
+        os.replace(tmp, os.path.join(folder, 'model.keras'))
+        tmp = temp_path(folder, 'scaler.pkl')
+        with open(tmp, 'wb') as f:
+            pickle.dump(entry['scaler'], f)
+        os.replace(tmp, os.path.join(folder, 'scaler.pkl'))
+        self._touch(key, entry['meta'])
+        self._evict_disk()
+
+    def _touch(self, key, meta):
+        meta['last_used'] = time.time()
+        write_json(os.path.join(self.folder, key, 'meta.json'), meta)
+
+    def _evict_disk(self):
+        saved = []
+        for key in os.listdir(self.folder):
+            try:
+                with open(os.path.join(self.folder, key, 'meta.json')) as f:
+                    saved.append((json.load(f).get('last_used', 0), key))
+            except (OSError, ValueError):
+                saved.append((0, key))
+        saved.sort()
+        for _, key in saved[:max(0, len(saved) - self.max_on_disk)]:
+            with self.lock:
+                self.loaded.pop(key, None)
+            shutil.rmtree(os.path.join(self.folder, key), ignore_errors=True)
+
+    def _train(self, dates, values, look_back, units, epochs):
+        from sklearn.preprocessing import MinMaxScaler
+        scaler = MinMaxScaler(feature_range=(0, 1))
+        X_lstm, y_lstm = make_windows(scaler.fit_transform(values), look_back)
+        # Train on the first 80% of windows so the chart's test range stays unseen.
+        split_idx = int(len(X_lstm) * 0.8)
+        model = build_lstm(look_back, units)
+        model.fit(X_lstm[:split_idx], y_lstm[:split_idx], batch_size=32, epochs=epochs, verbose=0)
+        # trained_through: target date of the newest window the model has fit
+        meta = {'last_date': str(dates[-1]), 'look_back': look_back, 'units': units,
+                'epochs': epochs, 'trained_at': time.time(),
+                'trained_through': str(dates[look_back + split_idx - 1])}
+        return {'model': model, 'scaler': scaler, 'meta': meta}
+
+    def _drifted(self, scaler, values):
+        lo, hi = scaler.data_min_[0], scaler.data_max_[0]
+        slack = (hi - lo) * self.retrain_drift
+        return values.min() < lo - slack or values.max() > hi + slack
+
+    def get(self, ticker, dates, values, look_back=60, units=50, epochs=5):
+        """Return (model, scaler, status) for `ticker`, training only what is needed."""
+        key = self.key(ticker, look_back, units, epochs)
+        with self._key_lock(key):
+            with self.lock:
+                entry = self.loaded.get(key)
+            if entry is None:
+                entry = self._load(key)
+            if entry is None or self._drifted(entry['scaler'], values):
+                entry = self._train(dates, values, look_back, units, epochs)
+                status = 'trained'
+                self._save(key, entry)
+            else:
+                # Fine-tune only on windows that have moved into the training
+                # 80% since the last fit; the newest 20% is the chart's test
+                # range and must stay unseen.
+                X_lstm, y_lstm = make_windows(entry['scaler'].transform(values), look_back)
+                split_idx = int(len(X_lstm) * 0.8)
+                targets = dates[look_back:]
+                meta = entry['meta']
+                trained = np.datetime64(meta.get('trained_through', meta['last_date']), 'D')
+                fresh = np.nonzero(targets[:split_idx] > trained)[0]
+                if len(fresh):
+                    entry['model'].fit(X_lstm[fresh], y_lstm[fresh], batch_size=32,
+                                       epochs=self.finetune_epochs, verbose=0)
+                    meta['trained_through'] = str(targets[split_idx - 1])
+                    meta['last_date'] = str(dates[-1])
+                    status = 'fine_tuned'
+                    self._save(key, entry)
+                else:
+                    status = 'cached'
+                    self._touch(key, entry['meta'])
+            self._remember(key, entry)
+            return entry['model'], entry['scaler'], status
+
+model_registry = ModelRegistry(app.config['MODEL_REGISTRY_DIR'],
+                               max_loaded=app.config['MODEL_REGISTRY_MAX_LOADED'],
+                               max_on_disk=app.config['MODEL_REGISTRY_MAX_ON_DISK'],
+                               finetune_epochs=app.config['MODEL_FINETUNE_EPOCHS'],
+                               retrain_drift=app.config['MODEL_RETRAIN_DRIFT'])
+
+def bounded_int(data, name, default):
+    """Read an integer parameter within its FORECAST_<NAME>_RANGE; ValueError if not."""
+    lo, hi = app.config[f'FORECAST_{name.upper()}_RANGE']
+    try:
+        value = int(data.get(name, default))
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be an integer')
+    if not lo <= value <= hi:
+        raise ValueError(f'{name} must be between {lo} and {hi}')
+    return value
+
+def lstm_params(data):
+    """(look_back, units, epochs) from a request body, validated."""
+    return (bounded_int(data, 'look_back', 60),  # Look at past 60 days to predict next day
+            bounded_int(data, 'units', 50),
+            bounded_int(data, 'epochs', 5))
+
+# Tickers name cache folders and files, so only plain symbols are accepted
+# (e.g. AAPL, BRK-B, ^GSPC, EURUSD=X); no leading dot and no '..'.
+TICKER_RE = re.compile(r'^(?!\.)(?!.*\.\.)[A-Z0-9.\-^=]{1,15}$')
+
+def valid_ticker(ticker):
+    """Upper-cased ticker, or ValueError if it is not a plain symbol."""
+    ticker = str(ticker).strip().upper()
+    if not TICKER_RE.match(ticker):
+        raise ValueError(f'Invalid ticker: {ticker[:20]!r}')
+    return ticker
+
+def forecast_params(data):
+    """Read ticker and LSTM hyperparameters from a /predict_stock style body."""
+    return (valid_ticker(data.get('ticker', 'AAPL')),) + lstm_params(data)
+
 @app.route('/predict_stock', methods=['POST'])
 def predict_stock():
-    data = request.json
-    ticker = data.get('ticker', 'AAPL')
+    try:
+        params = forecast_params(request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    body, code = forecast_stock(*params)
+    return jsonify(body), code
+
+def forecast_stock(ticker, look_back=60, units=50, epochs=5):
+    """Run both models for `ticker`; returns (json body, http status)."""
+    from sklearn.linear_model import LinearRegression
+    from sklearn.model_selection import train_test_split
     
-    # 1. Fetch Data
-    stock = yf.download(ticker, period='2y', interval='1d')
-    if stock.empty: return jsonify({'error': 'Invalid Ticker'}), 400
+    # 1. Fetch Data (from the local cache, topped up with any new bars)
+    dates, closes = price_cache.get(ticker)
+    if len(closes) == 0: return {'error': 'Invalid Ticker'}, 400
+    if len(closes) <= look_back * 2: return {'error': 'Not enough history for look_back'}, 400
 
     # Get 'Close' prices
-    values = stock['Close'].values.reshape(-1, 1)
+    values = closes.reshape(-1, 1)
     
     # --- MODEL A: LINEAR REGRESSION ---
     # Prepare simple X (days) and y (price)
@@ -57,62 +611,249 @@ def predict_stock():
     lr_preds = lr.predict(X_test_lin).flatten()
 
     # --- MODEL B: LSTM ---
-    # LSTM requires data scaling (0 to 1) and "lookback" windows
-    scaler = MinMaxScaler(feature_range=(0, 1))
-    scaled_data = scaler.fit_transform(values)
-    
-    look_back = 60  # Look at past 60 days to predict next day
-    X_lstm, y_lstm = [], []
-    
-    for i in range(look_back, len(scaled_data)):
-        X_lstm.append(scaled_data[i-look_back:i, 0])
-        y_lstm.append(scaled_data[i, 0])
-        
-    X_lstm, y_lstm = np.array(X_lstm), np.array(y_lstm)
-    X_lstm = np.reshape(X_lstm, (X_lstm.shape[0], X_lstm.shape[1], 1)) # Reshape for LSTM [samples, time steps, features]
+    # Reuse the registered model for this ticker/hyperparameters; it is only
+    # trained (or fine-tuned on new bars) when needed.
+    model, scaler, model_status = model_registry.get(ticker, dates, values, look_back, units, epochs)
+    X_lstm, y_lstm = make_windows(scaler.transform(values), look_back)
     
     # Split for LSTM (keeping the same time range as Linear Regression for comparison)
     split_idx = int(len(X_lstm) * 0.8)
-    X_train_lstm, X_test_lstm = X_lstm[:split_idx], X_lstm[split_idx:]
-    y_train_lstm, y_test_lstm = y_lstm[:split_idx], y_lstm[split_idx:]
-
-    # Build LSTM Model
-    model = Sequential()
-    model.add(LSTM(units=50, return_sequences=False, input_shape=(X_train_lstm.shape[1], 1)))
-    model.add(Dense(1))
-    model.compile(optimizer='adam', loss='mean_squared_error')
-    
-    # Train (batch_size=32, epochs=5 is enough for a quick demo)
-    model.fit(X_train_lstm, y_train_lstm, batch_size=32, epochs=5, verbose=0)
+    X_test_lstm = X_lstm[split_idx:]
     
     # Predict
-    lstm_preds_scaled = model.predict(X_test_lstm)
+    lstm_preds_scaled = model.predict(X_test_lstm, verbose=0)
     lstm_preds = scaler.inverse_transform(lstm_preds_scaled).flatten()
 
     # --- PREPARE RESPONSE ---
     # We align the data so the graph matches up.
-    # Note: LSTM cuts off the first 60 days (look_back), so we must adjust indices.
+    # Note: LSTM cuts off the first look_back days, so we must adjust indices.
     
     # Total dates available
-    all_dates = stock.index.strftime('%Y-%m-%d').tolist()
-    
-    # Padding Linear Regression to match chart
-    # (The test set is the last 20% of the data)
-    test_start_idx = len(values) - len(lr_preds)
+    all_dates = np.datetime_as_string(dates, unit='D').tolist()
     
     # Padding LSTM to match chart
     # (LSTM test set is shorter because of look_back, but covers same date range roughly)
     lstm_padding = [None] * (len(values) - len(lstm_preds))
     lr_padding = [None] * (len(values) - len(lr_preds))
 
-    return jsonify({
+    return {
         'dates': all_dates,
         'actual': values.flatten().tolist(),
         'linear_preds': lr_padding + lr_preds.tolist(),
-        'lstm_preds': lstm_padding + lstm_preds.tolist()
-    })
+        'lstm_preds': lstm_padding + lstm_preds.tolist(),
+        'model_status': model_status
+    }, 200
+
+def fit_linear_trends(series_list, test_size=0.2):
+    """Fit price ~ day for many series at once and predict each one's test tail.
+
+    Equivalent to LinearRegression on a shuffle-free train_test_split per
+    series, solved in closed form over a NaN-padded [series, days] matrix.
+    """
+    lengths = np.array([len(s) for s in series_list])
+    n_test = np.ceil(lengths * test_size).astype(int)
+    n_train = lengths - n_test
+    days = np.arange(lengths.max())
+    Y = np.full((len(series_list), lengths.max()), np.nan)
+    for row, s in enumerate(series_list):
+        Y[row, :len(s)] = s
+    train = days[np.newaxis, :] < n_train[:, np.newaxis]
+    X = np.where(train, days, np.nan)
+    x_mean = np.nanmean(X, axis=1, keepdims=True)
+    y_mean = np.nanmean(np.where(train, Y, np.nan), axis=1, keepdims=True)
+    slope = (np.nansum((X - x_mean) * (Y - y_mean), axis=1, keepdims=True)
+             / np.nansum((X - x_mean) ** 2, axis=1, keepdims=True))
+    preds = y_mean + slope * (days - x_mean)
+    return [preds[row, n_train[row]:lengths[row]] for row in range(len(series_list))]
+
+def predict_stacked(models, inputs):
+    """Run several single-input models in one predict call.
+
+    Inputs are zero-padded to the longest sample count and the per-model
+    outputs are trimmed back afterwards.
+    """
+    from tensorflow.keras import Input, Model
+    longest = max(len(x) for x in inputs)
+    padded = [np.concatenate([x, np.zeros((longest - len(x),) + x.shape[1:])]) for x in inputs]
+    stacked_inputs = [Input(shape=x.shape[1:]) for x in inputs]
+    stacked = Model(stacked_inputs, [m(i) for m, i in zip(models, stacked_inputs)])
+    outputs = stacked.predict(padded, verbose=0)
+    if len(models) == 1:
+        outputs = [outputs]
+    return [out[:len(x)] for out, x in zip(outputs, inputs)]
+
+@app.route('/predict_stock_batch', methods=['POST'])
+def predict_stock_batch():
+    data = request.get_json(silent=True) or {}
+    raw = data.get('tickers', [])
+    if not isinstance(raw, list):
+        return jsonify({'error': 'tickers must be a list'}), 400
+    try:
+        tickers = list(dict.fromkeys(valid_ticker(t) for t in raw))
+        look_back, units, epochs = lstm_params(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not tickers: return jsonify({'error': 'tickers required'}), 400
+    if len(tickers) > app.config['FORECAST_BATCH_MAX_TICKERS']:
+        return jsonify({'error': f"At most {app.config['FORECAST_BATCH_MAX_TICKERS']} tickers "
+                                 f"per request; use /jobs/predict_stock for more"}), 400
+
+    results, ready = {}, []
+    for ticker in tickers:
+        dates, closes = price_cache.get(ticker)
+        if len(closes) == 0:
+            results[ticker] = {'error': 'Invalid Ticker'}
+        elif len(closes) <= look_back * 2:
+            results[ticker] = {'error': 'Not enough history for look_back'}
+        else:
+            ready.append((ticker, dates, closes.reshape(-1, 1)))
+    if not ready:
+        return jsonify({'results': results})
+
+    # --- MODEL A: one closed-form linear fit across all tickers ---
+    lr_preds_all = fit_linear_trends([values[:, 0] for _, _, values in ready])
+
+    # --- MODEL B: registry models, scored together in one stacked pass ---
+    models, scalers, statuses, test_inputs = [], [], [], []
+    for ticker, dates, values in ready:
+        model, scaler, status = model_registry.get(ticker, dates, values, look_back, units, epochs)
+        X_lstm, _ = make_windows(scaler.transform(values), look_back)
+        models.append(model)
+        scalers.append(scaler)
+        statuses.append(status)
+        test_inputs.append(X_lstm[int(len(X_lstm) * 0.8):])
+    lstm_scaled_all = predict_stacked(models, test_inputs)
+
+    for (ticker, dates, values), lr_preds, lstm_scaled, scaler, status in zip(
+            ready, lr_preds_all, lstm_scaled_all, scalers, statuses):
+        lstm_preds = scaler.inverse_transform(lstm_scaled).flatten()
+        results[ticker] = {
+            'dates': np.datetime_as_string(dates, unit='D').tolist(),
+            'actual': values.flatten().tolist(),
+            'linear_preds': [None] * (len(values) - len(lr_preds)) + lr_preds.tolist(),
+            'lstm_preds': [None] * (len(values) - len(lstm_preds)) + lstm_preds.tolist(),
+            'model_status': status
+        }
+    return jsonify({'results': results})
+
+# Forecast jobs: training runs in a bounded process pool instead of the Flask
+# request thread. Identical in-flight requests share one job, and finished
+# jobs are kept for FORECAST_RESULT_TTL seconds.
+app.config['FORECAST_WORKERS'] = 2
+app.config['FORECAST_RESULT_TTL'] = 600
+
+class ForecastJobs:
+    """Job table over a ProcessPoolExecutor with in-flight coalescing."""
+
+    def __init__(self, max_workers=2, result_ttl=600):
+        self.max_workers = max_workers
+        self.result_ttl = result_ttl
+        self.pool = None  # started on first submit
+        self.jobs = {}      # job id -> job dict
+        self.inflight = {}  # (ticker, look_back, units, epochs) -> job id
+        self.lock = threading.Lock()
+
+    def _new_pool(self):
+        from concurrent.futures import ProcessPoolExecutor
+        # spawn, not fork: the server has TensorFlow loaded and threads that
+        # may hold locks (e.g. PriceCache during a download), and a forked
+        # child would inherit those locks held forever.
+        self.pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                        mp_context=multiprocessing.get_context('spawn'))
+
+    def submit(self, params):
+        from concurrent.futures.process import BrokenProcessPool
+        with self.lock:
+            self._expire()
+            job_id = self.inflight.get(params)
+            if job_id is not None:
+                self.jobs[job_id]['coalesced'] += 1
+                return self.jobs[job_id]
+            if self.pool is None:
+                self._new_pool()
+            try:
+                future = self.pool.submit(forecast_stock, *params)
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory); jobs it held have
+                # failed, but new ones get a fresh pool
+                app.logger.warning("Forecast pool broken; starting a new one")
+                self._new_pool()
+                future = self.pool.submit(forecast_stock, *params)
+            job_id = uuid.uuid4().hex
+            job = {'id': job_id, 'params': params, 'created': time.time(), 'finished': None,
+                   'coalesced': 0, 'future': future}
+            self.jobs[job_id] = job
+            self.inflight[params] = job_id
+        job['future'].add_done_callback(lambda _: self._finish(job))
+        return job
+
+    def _finish(self, job):
+        with self.lock:
+            job['finished'] = time.time()
+            if self.inflight.get(job['params']) == job['id']:
+                del self.inflight[job['params']]
+
+    def _expire(self):
+        now = time.time()
+        for job_id in [j for j, job in self.jobs.items()
+                       if job['finished'] and now - job['finished'] > self.result_ttl]:
+            del self.jobs[job_id]
+
+    def get(self, job_id):
+        with self.lock:
+            self._expire()
+            return self.jobs.get(job_id)
+
+    @staticmethod
+    def status(job):
+        future = job['future']
+        if not future.done():
+            state = 'running' if future.running() else 'queued'
+        elif future.cancelled() or future.exception() is not None:
+            state = 'failed'
+        else:
+            state = 'done'
+        ticker, look_back, units, epochs = job['params']
+        return {'job_id': job['id'], 'status': state, 'ticker': ticker,
+                'look_back': look_back, 'units': units, 'epochs': epochs,
+                'created': job['created'], 'finished': job['finished'],
+                'coalesced': job['coalesced']}
+
+forecast_jobs = ForecastJobs(max_workers=app.config['FORECAST_WORKERS'],
+                             result_ttl=app.config['FORECAST_RESULT_TTL'])
+
+@app.route('/jobs/predict_stock', methods=['POST'])
+def submit_forecast_job():
+    try:
+        params = forecast_params(request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    job = forecast_jobs.submit(params)
+    return jsonify(ForecastJobs.status(job)), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def forecast_job_status(job_id):
+    job = forecast_jobs.get(job_id)
+    if job is None: return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(ForecastJobs.status(job))
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def forecast_job_result(job_id):
+    job = forecast_jobs.get(job_id)
+    if job is None: return jsonify({'error': 'Unknown or expired job'}), 404
+    status = ForecastJobs.status(job)
+    if status['status'] in ('queued', 'running'):
+        return jsonify(status), 202
+    if status['status'] == 'failed':
+        return jsonify(dict(status, error=str(job['future'].exception()))), 500
+    body, code = job['future'].result()
+    return jsonify(body), code
+
 @app.route('/')
 def home():
     return render_template('index.html')
 if __name__ == '__main__':
+    # With the debug reloader only the serving child (WERKZEUG_RUN_MAIN) warms up.
+    if app.config['CLASSIFIER_WARMUP'] and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_warm_up()
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -1,6 +1,16 @@
+import hashlib
+import json
 import os
-from flask import Flask, render_template, request, jsonify
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, abort, make_response, render_template, request, jsonify, session
 from werkzeug.utils import secure_filename
+import numpy as np
 import pandas as pd
 import ollama
 
@@ -8,60 +18,582 @@ from langchain_community.document_loaders import PyPDFLoader, Docx2txtLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
 from langchain_ollama import OllamaLLM, OllamaEmbeddings
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings, DeterministicFakeEmbedding
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
 
 # ---------------- APP SETUP ----------------
 app = Flask(__name__)
+app.secret_key = "secret"
 
 UPLOAD_FOLDER = "uploads"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 
-qa_chain = None
-active_model = None
+# Built FAISS indexes are saved here, keyed by document hash + settings
+INDEX_FOLDER = "indexes"
+os.makedirs(INDEX_FOLDER, exist_ok=True)
+app.config["INDEX_FOLDER"] = INDEX_FOLDER
+app.config["CHUNK_SIZE"] = 1000
+app.config["CHUNK_OVERLAP"] = 200
+
+# Chunk embeddings are cached in SQLite, keyed by (model, sha256 of chunk text)
+app.config["EMBED_CACHE_PATH"] = "embedding_cache.sqlite"
+app.config["EMBED_BATCH_SIZE"] = 32
+# "ollama", or "fake" for offline tests (deterministic hash-based vectors)
+app.config["EMBEDDING_BACKEND"] = "ollama"
+app.config["FAKE_EMBEDDING_SIZE"] = 384
+
+# Each browser session (or explicit "collection" id) gets its own merged
+# index. Idle collections are spilled to disk once the memory budget is hit.
+COLLECTION_FOLDER = "collections"
+os.makedirs(COLLECTION_FOLDER, exist_ok=True)
+app.config["COLLECTION_FOLDER"] = COLLECTION_FOLDER
+app.config["INDEX_MEMORY_BUDGET_MB"] = 512
+
+# New documents are indexed by background workers, page by page (or in row
+# chunks for spreadsheets); the collection is queryable while this runs.
+app.config["INGEST_WORKERS"] = 2
+app.config["EXCEL_ROWS_PER_CHUNK"] = 200
+
+# Answers are cached per collection index and reused for questions whose
+# embedding is at least this similar (cosine) to a cached question.
+app.config["ANSWER_CACHE_THRESHOLD"] = 0.95
+app.config["ANSWER_CACHE_TTL"] = 3600
+app.config["ANSWER_CACHE_MAX_ENTRIES"] = 1000
 
 # ---------------- HELPERS ----------------
-def load_document(path):
-    if path.endswith(".pdf"):
-        return PyPDFLoader(path).load()
-    if path.endswith(".docx"):
-        return Docx2txtLoader(path).load()
-    if path.endswith((".xls", ".xlsx")):
+def iter_spreadsheet(path, rows_per_chunk):
+    """Yield the first sheet as text Documents of `rows_per_chunk` rows each."""
+    def render(header, rows, start):
+        text = pd.DataFrame(rows, columns=header).to_string()
+        return Document(page_content=text,
+                        metadata={"source": path, "rows": f"{start}-{start + len(rows) - 1}"})
+
+    if path.endswith(".xlsx"):
+        from openpyxl import load_workbook
+        wb = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = wb.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            header = ["" if h is None else str(h) for h in header]
+            chunk, start = [], 1
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) == rows_per_chunk:
+                    yield render(header, chunk, start)
+                    chunk, start = [], start + rows_per_chunk
+            if chunk:
+                yield render(header, chunk, start)
+        finally:
+            wb.close()
+    else:
+        # Legacy .xls has no streaming reader; load once, render in slices
         df = pd.read_excel(path)
-        return [{"page_content": df.to_string(), "metadata": {"source": path}}]
-    return []
+        for start in range(0, len(df), rows_per_chunk):
+            chunk = df.iloc[start:start + rows_per_chunk]
+            yield render(list(df.columns), chunk.values.tolist(), start + 1)
+
+def iter_document(path):
+    """Yield a document one unit at a time: PDF pages, the DOCX, or row chunks."""
+    if path.endswith(".pdf"):
+        yield from PyPDFLoader(path).lazy_load()
+    elif path.endswith(".docx"):
+        yield from Docx2txtLoader(path).lazy_load()
+    elif path.endswith((".xls", ".xlsx")):
+        yield from iter_spreadsheet(path, app.config["EXCEL_ROWS_PER_CHUNK"])
+
+def count_units(path):
+    """Number of units iter_document will yield, when cheap to know up front."""
+    try:
+        if path.endswith(".pdf"):
+            from pypdf import PdfReader
+            return len(PdfReader(path).pages)
+        if path.endswith(".docx"):
+            return 1
+    except Exception:
+        pass
+    return None
 
 def model_exists(model_name):
+    if app.config["EMBEDDING_BACKEND"] == "fake":
+        return True
     models = ollama.list()["models"]
     return any(m["name"] == model_name for m in models)
 
-def build_chain(docs, model):
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    splits = splitter.split_documents(docs)
+class EmbeddingCache:
+    """On-disk store of chunk vectors plus hit/miss/timing counters."""
 
-    embeddings = OllamaEmbeddings(model=model)
-    vectorstore = FAISS.from_documents(splits, embeddings)
-    retriever = vectorstore.as_retriever()
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT, text_hash TEXT, vector BLOB, PRIMARY KEY (model, text_hash))"
+        )
+        self.db.commit()
+        self.stats = {"hits": 0, "misses": 0, "embed_calls": 0, "embed_seconds": 0.0}
 
-    llm = OllamaLLM(model=model)
+    def get_many(self, model, hashes):
+        found = {}
+        with self.lock:
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i:i + 500]
+                rows = self.db.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model=? "
+                    f"AND text_hash IN ({','.join('?' * len(chunk))})",
+                    [model, *chunk],
+                ).fetchall()
+                found.update((h, np.frombuffer(v, dtype=np.float32).tolist()) for h, v in rows)
+        return found
+
+    def put_many(self, model, items):
+        with self.lock:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                [(model, h, np.asarray(v, dtype=np.float32).tobytes()) for h, v in items],
+            )
+            self.db.commit()
+
+    def record(self, hits, misses, calls=0, seconds=0.0):
+        with self.lock:
+            self.stats["hits"] += hits
+            self.stats["misses"] += misses
+            self.stats["embed_calls"] += calls
+            self.stats["embed_seconds"] += seconds
+
+    def snapshot(self):
+        with self.lock:
+            s = dict(self.stats)
+        lookups = s["hits"] + s["misses"]
+        s["hit_rate"] = round(s["hits"] / lookups, 4) if lookups else 0.0
+        s["embed_seconds"] = round(s["embed_seconds"], 3)
+        return s
+
+embedding_cache = EmbeddingCache(app.config["EMBED_CACHE_PATH"])
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only sends cache misses to the backend, in batches."""
+
+    def __init__(self, backend, model, cache, batch_size=32):
+        self.backend = backend
+        self.model = model
+        self.cache = cache
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts):
+        hashes = [hashlib.sha256(t.encode("utf-8")).hexdigest() for t in texts]
+        vectors = self.cache.get_many(self.model, list(set(hashes)))
+
+        # Embed each distinct missing chunk once, batch_size texts per call
+        missing = list({h: t for h, t in zip(hashes, texts) if h not in vectors}.items())
+        calls, started = 0, time.perf_counter()
+        for i in range(0, len(missing), self.batch_size):
+            batch = missing[i:i + self.batch_size]
+            embedded = self.backend.embed_documents([t for _, t in batch])
+            calls += 1
+            # Round through float32 so fresh and cached vectors are identical
+            new = [(h, np.asarray(v, dtype=np.float32).tolist()) for (h, _), v in zip(batch, embedded)]
+            self.cache.put_many(self.model, new)
+            vectors.update(new)
+
+        # Repeats of a chunk within one call are served by its first embedding
+        self.cache.record(len(hashes) - len(missing), len(missing), calls,
+                          time.perf_counter() - started if calls else 0.0)
+        return [vectors[h] for h in hashes]
+
+    def embed_query(self, text):
+        return self.backend.embed_query(text)
 
-    prompt = ChatPromptTemplate.from_template(
-        """Answer the question using ONLY the context below:
+def get_embeddings(model):
+    if app.config["EMBEDDING_BACKEND"] == "fake":
+        backend = DeterministicFakeEmbedding(size=app.config["FAKE_EMBEDDING_SIZE"])
+    else:
+        backend = OllamaEmbeddings(model=model)
+    return CachedEmbeddings(backend, f"{app.config['EMBEDDING_BACKEND']}:{model}",
+                            embedding_cache, app.config["EMBED_BATCH_SIZE"])
+
+def index_key(content, model):
+    """Content address of an index: file bytes + embedding model + chunking settings."""
+    h = hashlib.sha256(content)
+    h.update(f"|{app.config['EMBEDDING_BACKEND']}:{model}|RecursiveCharacterTextSplitter"
+             f"|{app.config['CHUNK_SIZE']}|{app.config['CHUNK_OVERLAP']}"
+             f"|rows{app.config['EXCEL_ROWS_PER_CHUNK']}".encode())
+    return h.hexdigest()
+
+def load_saved_index(key, model):
+    """Return the saved index for `key`, or None if it has not been built yet."""
+    folder = os.path.join(app.config["INDEX_FOLDER"], key)
+    if not os.path.exists(os.path.join(folder, "index.faiss")):
+        return None
+    # Indexes are only ever written by this app, so the pickle is trusted
+    return FAISS.load_local(folder, get_embeddings(model), allow_dangerous_deserialization=True)
+
+QA_PROMPT = ChatPromptTemplate.from_template(
+    """Answer the question using ONLY the context below:
 
 {context}
 
 Question: {question}
 Answer:"""
-    )
+)
+
+def build_chain(model):
+    """Answer chain over {"context": retrieved docs, "question": str}."""
+    llm = OllamaLLM(model=model)
+
+    return QA_PROMPT | llm | StrOutputParser()
+
+class AnswerCache:
+    """Semantic cache of answers per index id, with TTL and LRU size bound."""
+
+    def __init__(self, threshold, ttl, max_entries):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (index id, normalized question) -> entry
+        self.lock = threading.Lock()
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "invalidations": 0}
+
+    @staticmethod
+    def normalize(question):
+        return " ".join(question.lower().split())
+
+    @staticmethod
+    def unit(vector):
+        v = np.asarray(vector, dtype=np.float32)
+        return v / (np.linalg.norm(v) or 1.0)
+
+    def lookup(self, index_id, question, embed):
+        """Return a cached answer or None; `embed` is only called if needed.
+
+        Also returns the question's embedding so a miss can reuse it for
+        retrieval. It is returned as produced (not unit-normalized), so the L2
+        index ranks documents exactly as similarity_search(question) would.
+        """
+        key = (index_id, self.normalize(question))
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and now - entry["created"] <= self.ttl:
+                self.entries.move_to_end(key)
+                self.stats["exact_hits"] += 1
+                return entry["answer"], entry["vector"]
+        raw = np.asarray(embed(question))
+        vector = self.unit(raw)
+        with self.lock:
+            candidates = [(k, e) for k, e in self.entries.items()
+                          if k[0] == index_id and now - e["created"] <= self.ttl]
+            if candidates:
+                scores = np.stack([e["vector"] for _, e in candidates]) @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self.entries.move_to_end(candidates[best][0])
+                    self.stats["semantic_hits"] += 1
+                    return candidates[best][1]["answer"], raw
+            self.stats["misses"] += 1
+        return None, raw
+
+    def store(self, index_id, question, vector, answer):
+        with self.lock:
+            key = (index_id, self.normalize(question))
+            self.entries[key] = {"vector": self.unit(vector), "answer": answer,
+                                 "created": time.time()}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, index_id):
+        with self.lock:
+            for key in [k for k in self.entries if k[0] == index_id]:
+                del self.entries[key]
+            self.stats["invalidations"] += 1
+
+    def snapshot(self):
+        with self.lock:
+            s = dict(self.stats, entries=len(self.entries))
+        lookups = s["exact_hits"] + s["semantic_hits"] + s["misses"]
+        s["hit_rate"] = round((lookups - s["misses"]) / lookups, 4) if lookups else 0.0
+        return s
+
+answer_cache = AnswerCache(app.config["ANSWER_CACHE_THRESHOLD"],
+                           app.config["ANSWER_CACHE_TTL"],
+                           app.config["ANSWER_CACHE_MAX_ENTRIES"])
+
+def index_size_bytes(vectorstore):
+    """Rough in-memory size of a FAISS store: float32 vectors + chunk text."""
+    vectors = vectorstore.index.ntotal * vectorstore.index.d * 4
+    text = sum(len(d.page_content) for d in vectorstore.docstore._dict.values())
+    return vectors + text
+
+class CollectionStore:
+    """Per-session merged indexes with an LRU memory budget.
+
+    Collections that do not fit in the budget are saved to disk and dropped
+    from memory; they are loaded back on their next use.
+    """
 
-    return (
-        {"context": retriever, "question": RunnablePassthrough()}
-        | prompt
-        | llm
-        | StrOutputParser()
-    )
+    def __init__(self, folder, budget_bytes):
+        self.folder = folder
+        self.budget = budget_bytes
+        self.active = OrderedDict()  # collection id -> collection dict (LRU order)
+        self.lock = threading.Lock()
+
+    def _path(self, cid):
+        name = secure_filename(cid)
+        if not name:
+            raise ValueError(f"Invalid collection id: {cid!r}")
+        return os.path.join(self.folder, name)
+
+    def _spill(self, cid, col):
+        folder = self._path(cid)
+        col["vectorstore"].save_local(folder)
+        with open(os.path.join(folder, "collection.json"), "w") as f:
+            json.dump({"model": col["model"], "documents": col["documents"],
+                       "index_id": col["index_id"]}, f)
+
+    def _restore(self, cid):
+        folder = self._path(cid)
+        try:
+            with open(os.path.join(folder, "collection.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        vectorstore = FAISS.load_local(folder, get_embeddings(meta["model"]),
+                                       allow_dangerous_deserialization=True)
+        return self._make(vectorstore, meta["model"], meta["documents"], meta.get("index_id"))
+
+    @staticmethod
+    def _make(vectorstore, model, documents, index_id=None):
+        return {"vectorstore": vectorstore, "model": model, "documents": documents,
+                "size": index_size_bytes(vectorstore), "chain": build_chain(model),
+                # Changes whenever the index content changes (answer cache key)
+                "index_id": index_id or uuid.uuid4().hex,
+                # Guards the index while background ingestion appends to it
+                "lock": threading.Lock()}
+
+    @staticmethod
+    def _changed(col):
+        old, col["index_id"] = col["index_id"], uuid.uuid4().hex
+        answer_cache.invalidate(old)
+
+    @staticmethod
+    def search(col, query, vector=None):
+        with col["lock"]:
+            if vector is not None:
+                return col["vectorstore"].similarity_search_by_vector(vector)
+            return col["vectorstore"].similarity_search(query)
+
+    def _evict(self, keep):
+        used = sum(c["size"] for c in self.active.values())
+        for cid in list(self.active):
+            if used <= self.budget:
+                break
+            if cid == keep:
+                continue
+            col = self.active.pop(cid)
+            self._spill(cid, col)
+            used -= col["size"]
+
+    def get(self, cid):
+        with self.lock:
+            col = self.active.get(cid)
+            if col is None:
+                col = self._restore(cid)
+                if col is None:
+                    return None
+                self.active[cid] = col
+                self._evict(keep=cid)
+            self.active.move_to_end(cid)
+            return col
+
+    def _open(self, cid, model):
+        """Active or restored collection for `cid`, or None if absent/other model."""
+        col = self.active.get(cid) or self._restore(cid)
+        if col is not None and col["model"] != model:
+            # Vectors from different embedding models cannot share an index
+            answer_cache.invalidate(col["index_id"])
+            col = None
+        return col
+
+    def _touch(self, cid, col):
+        self.active[cid] = col
+        self.active.move_to_end(cid)
+        self._evict(keep=cid)
+
+    def add_document(self, cid, doc_key, name, vectorstore, model):
+        """Merge a fully built document index into the collection."""
+        with self.lock:
+            col = self._open(cid, model)
+            if col is None:
+                col = self._make(vectorstore, model, [])
+            if not any(d["key"] == doc_key for d in col["documents"]):
+                if col["documents"]:
+                    with col["lock"]:
+                        col["vectorstore"].merge_from(vectorstore)
+                    col["size"] = index_size_bytes(col["vectorstore"])
+                    self._changed(col)
+                col["documents"].append({"key": doc_key, "name": name, "status": "ready"})
+            self._touch(cid, col)
+            return col
+
+    def extend(self, cid, doc_key, name, model, text_embeddings, metadatas, embeddings):
+        """Append freshly embedded chunks of a document that is still being ingested.
+
+        Returns the chunk ids, so a failed ingest can take them out again.
+        """
+        ids = [uuid.uuid4().hex for _ in text_embeddings]
+        with self.lock:
+            col = self._open(cid, model)
+            if col is None:
+                col = self._make(FAISS.from_embeddings(text_embeddings, embeddings,
+                                                       metadatas=metadatas, ids=ids), model, [])
+            else:
+                with col["lock"]:
+                    col["vectorstore"].add_embeddings(text_embeddings, metadatas=metadatas,
+                                                      ids=ids)
+                col["size"] = index_size_bytes(col["vectorstore"])
+                self._changed(col)
+            if not any(d["key"] == doc_key for d in col["documents"]):
+                col["documents"].append({"key": doc_key, "name": name, "status": "indexing"})
+            self._touch(cid, col)
+        return ids
+
+    def discard(self, cid, doc_key, ids):
+        """Undo a failed ingest: remove its chunks and its document entry."""
+        with self.lock:
+            col = self.active.get(cid) or self._restore(cid)
+            if col is None:
+                return
+            col["documents"] = [d for d in col["documents"] if d["key"] != doc_key]
+            if not col["documents"]:
+                # Nothing else in the collection: drop it rather than keep an empty index
+                self.active.pop(cid, None)
+                answer_cache.invalidate(col["index_id"])
+                shutil.rmtree(self._path(cid), ignore_errors=True)
+                return
+            if ids:
+                with col["lock"]:
+                    col["vectorstore"].delete(ids)
+                col["size"] = index_size_bytes(col["vectorstore"])
+                self._changed(col)
+            self._touch(cid, col)
+
+    def mark_ready(self, cid, doc_key):
+        with self.lock:
+            col = self.active.get(cid) or self._restore(cid)
+            if col is None:
+                return
+            for d in col["documents"]:
+                if d["key"] == doc_key:
+                    d["status"] = "ready"
+            self._touch(cid, col)
+
+    def drop(self, cid):
+        with self.lock:
+            col = self.active.pop(cid, None)
+            if col is not None:
+                answer_cache.invalidate(col["index_id"])
+            shutil.rmtree(self._path(cid), ignore_errors=True)
+
+    def snapshot(self):
+        with self.lock:
+            return {"in_memory": len(self.active),
+                    "memory_bytes": sum(c["size"] for c in self.active.values()),
+                    "budget_bytes": self.budget,
+                    "on_disk": len(os.listdir(self.folder))}
+
+collection_store = CollectionStore(app.config["COLLECTION_FOLDER"],
+                                   app.config["INDEX_MEMORY_BUDGET_MB"] * 1024 * 1024)
+
+class IngestJobs:
+    """Background ingestion: stream units -> split -> embed -> index, with progress."""
+
+    def __init__(self, workers):
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.jobs = {}
+        self.inflight = {}  # (collection, document key) -> job id
+        self.lock = threading.Lock()
+
+    def submit(self, path, key, cid, name, model):
+        with self.lock:
+            # The same document re-uploaded mid-ingest joins the running job
+            running = self.inflight.get((cid, key))
+            if running is not None:
+                return self.jobs[running]
+            job = {"id": uuid.uuid4().hex, "document": name, "collection": cid,
+                   "status": "queued", "units_done": 0, "units_total": None,
+                   "chunks_indexed": 0, "started": None, "finished": None, "error": None}
+            self.jobs[job["id"]] = job
+            self.inflight[(cid, key)] = job["id"]
+        job["units_total"] = count_units(path)  # may open the file, so outside the lock
+        self.pool.submit(self._run, job, path, key, cid, name, model)
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _run(self, job, path, key, cid, name, model):
+        job["status"], job["started"] = "running", time.time()
+        chunk_ids = []
+        try:
+            embeddings = get_embeddings(model)
+            splitter = RecursiveCharacterTextSplitter(
+                chunk_size=app.config["CHUNK_SIZE"], chunk_overlap=app.config["CHUNK_OVERLAP"]
+            )
+            doc_index = None
+            for unit in iter_document(path):
+                unit.metadata["source"] = name  # not the content-keyed upload path
+                splits = splitter.split_documents([unit])
+                if splits:
+                    texts = [d.page_content for d in splits]
+                    metadatas = [d.metadata for d in splits]
+                    pairs = list(zip(texts, embeddings.embed_documents(texts)))
+                    # One copy for the saved per-document index, one for the
+                    # live collection so it can be queried right away
+                    if doc_index is None:
+                        doc_index = FAISS.from_embeddings(pairs, embeddings, metadatas=metadatas)
+                    else:
+                        doc_index.add_embeddings(pairs, metadatas=metadatas)
+                    chunk_ids += collection_store.extend(cid, key, name, model, pairs,
+                                                         metadatas, embeddings)
+                    job["chunks_indexed"] += len(splits)
+                job["units_done"] += 1
+            if doc_index is None:
+                raise ValueError("No text could be extracted from the document")
+            doc_index.save_local(os.path.join(app.config["INDEX_FOLDER"], key))
+            collection_store.mark_ready(cid, key)
+            job["status"] = "done"
+        except Exception as e:
+            job["status"], job["error"] = "error", str(e)
+            # Don't leave half a document behind; a re-upload starts clean
+            collection_store.discard(cid, key, chunk_ids)
+        finally:
+            job["finished"] = time.time()
+            with self.lock:
+                self.inflight.pop((cid, key), None)
+
+ingest_jobs = IngestJobs(app.config["INGEST_WORKERS"])
+
+def collection_id():
+    """Explicit "collection" from the request, else one id per browser session."""
+    data = request.get_json(silent=True) or {}
+    cid = request.form.get("collection") or data.get("collection")
+    if cid:
+        # Ids name folders under collections/; ".." etc. sanitize to nothing
+        cid = secure_filename(cid)
+        if not cid:
+            abort(make_response(jsonify({"error": "Invalid collection id"}), 400))
+        return cid
+    if "collection_id" not in session:
+        session["collection_id"] = uuid.uuid4().hex
+    return session["collection_id"]
 
 # ---------------- ROUTES ----------------
 @app.route("/")
@@ -70,8 +602,6 @@ def index():
 
 @app.route("/upload", methods=["POST"])
 def upload():
-    global qa_chain, active_model
-
     file = request.files.get("file")
     model = request.form.get("model")
 
@@ -81,23 +611,114 @@ def upload():
     if not model_exists(model):
         return jsonify({"error": f"Model '{model}' not found in Ollama"}), 400
 
-    path = os.path.join(app.config["UPLOAD_FOLDER"], secure_filename(file.filename))
-    file.save(path)
+    content = file.read()
+    key = index_key(content, model)
+    # Name the upload by its content key: a background job may still be reading
+    # an earlier upload that had the same filename
+    ext = os.path.splitext(secure_filename(file.filename))[1]
+    path = os.path.join(app.config["UPLOAD_FOLDER"], key + ext)
+    tmp = f"{path}.{uuid.uuid4().hex}.part"
+    with open(tmp, "wb") as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+    cid = collection_id()
+    vectorstore = load_saved_index(key, model)
+    if vectorstore is not None:
+        col = collection_store.add_document(cid, key, file.filename, vectorstore, model)
+        return jsonify({"message": f"Loaded saved index for this document ({model})",
+                        "cached": True, "collection": cid,
+                        "documents": [d["name"] for d in col["documents"]]})
 
-    docs = load_document(path)
-    qa_chain = build_chain(docs, model)
-    active_model = model
+    job = ingest_jobs.submit(path, key, cid, file.filename, model)
+    return jsonify({"message": f"Indexing started using {model}; you can ask questions "
+                               f"while it runs", "cached": False, "collection": cid,
+                    "job_id": job["id"]}), 202
 
-    return jsonify({"message": f"Document indexed using {model}"})
+@app.route("/upload/<job_id>/progress")
+def upload_progress(job_id):
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if job["units_total"]:
+        job["percent"] = round(100 * job["units_done"] / job["units_total"], 1)
+    return jsonify(job)
 
 @app.route("/chat", methods=["POST"])
 def chat():
-    if qa_chain is None:
+    col = collection_store.get(collection_id())
+    if col is None:
         return jsonify({"response": "⚠️ Upload a document first."})
 
     query = request.json.get("query")
-    answer = qa_chain.invoke(query)
-    return jsonify({"response": answer})
+    embed = get_embeddings(col["model"]).embed_query
+    index_id = col["index_id"]
+    answer, vector = answer_cache.lookup(index_id, query, embed)
+    if answer is not None:
+        return jsonify({"response": answer, "cached": True})
+
+    docs = CollectionStore.search(col, query, vector.tolist())
+    answer = col["chain"].invoke({"context": docs, "question": query})
+    answer_cache.store(index_id, query, vector, answer)
+    return jsonify({"response": answer, "cached": False})
+
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """Streaming /chat as NDJSON: one "context" line, then "token" lines, then "done"."""
+    col = collection_store.get(collection_id())
+    if col is None:
+        return jsonify({"response": "⚠️ Upload a document first."})
+
+    query = request.json.get("query")
+    index_id = col["index_id"]
+    cached, vector = answer_cache.lookup(index_id, query, get_embeddings(col["model"]).embed_query)
+    if cached is not None:
+        lines = [{"type": "token", "text": cached}, {"type": "done", "cached": True}]
+        return Response("".join(json.dumps(line) + "\n" for line in lines),
+                        mimetype="application/x-ndjson")
+
+    # Retrieve up front so the client gets the sources before generation starts
+    docs = CollectionStore.search(col, query, vector.tolist())
+
+    def generate():
+        yield json.dumps({"type": "context", "sources": [
+            {"source": d.metadata.get("source"), "page": d.metadata.get("page"),
+             "snippet": d.page_content[:200]} for d in docs
+        ]}) + "\n"
+        tokens = col["chain"].stream({"context": docs, "question": query})
+        answer = []
+        try:
+            for token in tokens:
+                answer.append(token)
+                yield json.dumps({"type": "token", "text": token}) + "\n"
+            # Only complete answers are cached, not ones cut off by a disconnect
+            answer_cache.store(index_id, query, vector, "".join(answer))
+            yield json.dumps({"type": "done", "cached": False}) + "\n"
+        finally:
+            # Runs on GeneratorExit too: when the client disconnects the server
+            # closes this generator, and closing the LLM stream aborts the
+            # request to Ollama so it stops generating.
+            tokens.close()
+
+    return Response(generate(), mimetype="application/x-ndjson",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/collection", methods=["DELETE"])
+def drop_collection():
+    collection_store.drop(collection_id())
+    return jsonify({"message": "Collection removed"})
+
+@app.route("/collections/stats")
+def collection_stats():
+    return jsonify(collection_store.snapshot())
+
+@app.route("/answer_cache/stats")
+def answer_cache_stats():
+    return jsonify(answer_cache.snapshot())
+
+@app.route("/embedding_stats")
+def embedding_stats():
+    return jsonify(embedding_cache.snapshot())
 
 if __name__ == "__main__":
     print("🚀 Flask running at http://127.0.0.1:5000")
@@ -1,12 +1,57 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+from bs4.dammit import UnicodeDammit
+from lxml import etree
+from urllib.parse import urljoin, urlparse, urlsplit, urlunsplit
+from concurrent.futures import (ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED,
+                                TimeoutError as FuturesTimeout)
+from collections import defaultdict, deque
+from itertools import islice
+import hashlib
+import json
+import math
+import os
+import threading
 import time
+import uuid
+import zlib
+import numpy as np
 from datetime import datetime
 
 app = Flask(__name__)
 
+# Fetch engine settings
+app.config['BATCH_MAX_URLS'] = 20          # URLs accepted by /api/batch-scrape
+app.config['BATCH_STREAM_MAX_URLS'] = 1000 # same, with "stream": true (no results kept)
+app.config['SCRAPE_WORKERS'] = 8           # concurrent fetches overall
+app.config['PER_HOST_CONCURRENCY'] = 2     # concurrent fetches per host
+app.config['PER_HOST_INTERVAL'] = 0.5      # min seconds between request starts per host
+app.config['REQUEST_TIMEOUT'] = 15         # per request (connect + read)
+app.config['BATCH_TIMEOUT'] = 60           # whole batch
+app.config['POOL_SIZE'] = 20               # keep-alive connections per host
+app.config['SCRAPE_PARSER'] = 'fast'       # 'fast' (single pass) or 'soup' (BeautifulSoup)
+
+# Crawl mode limits
+app.config['CRAWL_MAX_DEPTH'] = 3
+app.config['CRAWL_MAX_PAGES'] = 200
+app.config['CRAWL_SEEN_CAPACITY'] = 100000  # URLs the Bloom filter is sized for
+app.config['CRAWL_TIMEOUT'] = 300
+
+# Near-duplicate detection in compare_content (MinHash + LSH)
+app.config['DEDUP_NUM_PERM'] = 128     # MinHash signature length
+app.config['DEDUP_BANDS'] = 16         # LSH bands; rows per band = NUM_PERM / BANDS
+app.config['DEDUP_SHINGLE_SIZE'] = 5   # words per shingle
+app.config['DEDUP_THRESHOLD'] = 0.8    # estimated Jaccard to report as duplicate
+app.config['DEDUP_MAX_PAIRS'] = 100    # most similar pairs included in the response
+
+# On-disk cache of scraped pages (extracted data + validators), keyed by URL
+app.config['SCRAPE_CACHE_DIR'] = 'scrape_cache'
+app.config['SCRAPE_CACHE_FRESH'] = 300             # seconds served without asking the server
+app.config['SCRAPE_CACHE_MAX_AGE'] = 7 * 86400     # entries older than this are dropped
+app.config['SCRAPE_CACHE_MAX_BYTES'] = 50 * 1024 * 1024
+
 PALETTE = {
     'darkest': '#061E29',
     'dark_blue': '#1D546D',
@@ -14,41 +59,402 @@ PALETTE = {
     'light': '#F3F4F4'
 }
 
+class ScrapeCache:
+    """Disk cache of extracted page data with ETag/Last-Modified validators.
+
+    One JSON file per URL. Files are touched on every hit, so eviction by
+    mtime is least-recently-used.
+    """
+
+    def __init__(self, folder, fresh_seconds=300, max_age=7 * 86400, max_bytes=50 * 1024 * 1024):
+        self.folder = folder
+        self.fresh_seconds = fresh_seconds
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+        self.total_bytes = sum(os.path.getsize(os.path.join(folder, f)) for f in os.listdir(folder))
+
+    def _path(self, url):
+        return os.path.join(self.folder, hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, url):
+        path = self._path(url)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry['stored_at'] > self.max_age:
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            return None  # evicted meanwhile: treat as a miss
+        return entry
+
+    def is_fresh(self, entry):
+        return time.time() - entry['validated_at'] <= self.fresh_seconds
+
+    def put(self, url, data, headers, outlinks=None):
+        now = time.time()
+        self._write(url, {'url': url, 'data': data, 'outlinks': outlinks or [],
+                          'etag': headers.get('ETag'),
+                          'last_modified': headers.get('Last-Modified'),
+                          'stored_at': now, 'validated_at': now})
+
+    def revalidated(self, url, entry):
+        """Record a 304: the cached data is good for another fresh period."""
+        entry['validated_at'] = time.time()
+        self._write(url, entry)
+
+    def _write(self, url, entry):
+        """Store `entry`; a failed write only costs a future cache miss."""
+        path = self._path(url)
+        # Private temp name: the same URL may be cached by two threads at once
+        tmp = f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(entry, f)
+            with self.lock:
+                old = os.path.getsize(path) if os.path.exists(path) else 0
+                os.replace(tmp, path)
+                self.total_bytes += os.path.getsize(path) - old
+        except OSError as e:
+            app.logger.warning("Could not cache %s: %s", url, e)
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return
+        if self.total_bytes > self.max_bytes:
+            self._evict()
+
+    def _remove(self, path):
+        with self.lock:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                self.total_bytes -= size
+            except OSError:
+                pass
+
+    def _evict(self):
+        files = []
+        for name in os.listdir(self.folder):
+            if name.endswith('.json'):
+                path = os.path.join(self.folder, name)
+                try:
+                    files.append((os.path.getmtime(path), path))
+                except OSError:
+                    pass
+        files.sort()
+        for _, path in files:
+            if self.total_bytes <= self.max_bytes * 0.9:  # free a little headroom
+                break
+            self._remove(path)
+
+class PageExtractor:
+    """Single-pass lxml parser target that builds the scraper's `data` dict.
+
+    Produces the same fields as the BeautifulSoup path: content inside
+    SKIP_TAGS is ignored (the soup path decomposes those tags), element text
+    follows get_text(strip=True), and links/images stop being collected
+    once their caps are reached.
+
+    `outlinks` additionally lists every absolute http(s) link on the page,
+    navigation included, for the crawler (up to MAX_OUTLINKS).
+    """
+
+    SKIP_TAGS = {"script", "style", "nav", "footer", "iframe", "noscript"}
+    HEADINGS = ("h1", "h2", "h3")
+    MAX_LINKS = 20
+    MAX_IMAGES = 10
+    MAX_OUTLINKS = 200
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.stack = []        # one entry per open element: collector dict, 'skip' or None
+        self.collectors = []   # open elements whose text is being gathered
+        self.skip = 0
+        self.buffer = []       # pending character data of the current text node
+        self.text = []
+        self.title = None
+        self.headings = {h: None for h in self.HEADINGS}
+        self.paragraphs = []
+        self.links = []
+        self.images = []
+        self.outlinks = []
+        self.meta_description = None
+
+    def _flush(self):
+        # Adjacent data events form one text node, like a NavigableString
+        if not self.buffer:
+            return
+        node = ''.join(self.buffer).strip()
+        self.buffer = []
+        if node and not self.skip:
+            self.text.append(node)
+            for c in self.collectors:
+                c['parts'].append(node)
+
+    def _collect(self, kind, **extra):
+        c = dict(extra, kind=kind, parts=[])
+        self.collectors.append(c)
+        return c
+
+    def start(self, tag, attrib):
+        self._flush()
+        entry = None
+        if tag == 'a' and 'href' in attrib and len(self.outlinks) < self.MAX_OUTLINKS:
+            target = outlink(self.base_url, attrib['href'])
+            if target:
+                self.outlinks.append(target)
+        if tag in self.SKIP_TAGS:
+            self.skip += 1
+            entry = 'skip'
+        elif not self.skip:
+            if tag in self.headings:
+                if self.headings[tag] is None:
+                    self.headings[tag] = []
+                entry = self._collect(tag)
+            elif tag == 'p':
+                entry = self._collect('p')
+            elif tag == 'a' and 'href' in attrib and len(self.links) < self.MAX_LINKS:
+                href = attrib['href']
+                if href.startswith('http') or href.startswith('/'):
+                    link = {'text': '', 'url': urljoin(self.base_url, href)}
+                    self.links.append(link)
+                    entry = self._collect('a', link=link)
+            elif tag == 'img' and 'src' in attrib and len(self.images) < self.MAX_IMAGES:
+                self.images.append({'src': urljoin(self.base_url, attrib['src']),
+                                    'alt': attrib.get('alt', '')})
+            elif tag == 'title' and self.title is None:
+                entry = self._collect('title')
+            elif tag == 'meta' and self.meta_description is None and attrib.get('name') == 'description':
+                self.meta_description = attrib.get('content') or 'No description available.'
+        self.stack.append(entry)
+
+    def end(self, tag):
+        self._flush()
+        entry = self.stack.pop() if self.stack else None
+        if entry == 'skip':
+            self.skip -= 1
+        elif entry is not None:
+            self.collectors.remove(entry)
+            text = ''.join(entry['parts'])
+            kind = entry['kind']
+            if kind in self.headings:
+                if text:
+                    self.headings[kind].append(text)
+            elif kind == 'p':
+                if len(text) > 40:
+                    self.paragraphs.append(text)
+            elif kind == 'a':
+                entry['link']['text'] = text[:50]
+            elif kind == 'title':
+                self.title = text
+
+    def data(self, data):
+        self.buffer.append(data)
+
+    def comment(self, text):
+        self._flush()
+
+    def pi(self, target, data=None):
+        self._flush()
+
+    def close(self):
+        self._flush()
+        return {
+            'url': self.base_url,
+            'title': self.title or 'No Title Found',
+            'headings': {h: v for h, v in self.headings.items() if v is not None},
+            'paragraphs': self.paragraphs,
+            'links': self.links,
+            'images': self.images,
+            'meta_description': self.meta_description or 'No description available.',
+            'text_content': ' '.join(self.text),
+            'scraped_at': datetime.now().isoformat(),
+            'outlinks': self.outlinks
+        }
+
+def outlink(base_url, href):
+    """Absolute http(s) URL for a link, without its fragment; None otherwise."""
+    target = urljoin(base_url, href.strip()).split('#', 1)[0]
+    return target if target.startswith(('http://', 'https://')) else None
+
+def extract_fast(content, url):
+    """Run PageExtractor over raw page bytes (decoded the same way as bs4)."""
+    markup = UnicodeDammit(content, is_html=True).unicode_markup if isinstance(content, bytes) else content
+    parser = etree.HTMLParser(target=PageExtractor(url))
+    parser.feed(markup)
+    return parser.close()
+
 class WebScraper:
-    def __init__(self):
+    def __init__(self, workers=8, per_host_concurrency=2, per_host_interval=0.5,
+                 timeout=15, pool_size=20, cache=None, parser='fast'):
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
+        self.timeout = timeout
+        self.cache = cache
+        self.parser = parser
+        self.per_host_concurrency = per_host_concurrency
+        self.per_host_interval = per_host_interval
+
+        # One shared session so connections are kept alive and reused
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.host_lock = threading.Lock()
+        self.host_slots = {}   # host -> semaphore capping concurrent requests
+        self.host_next = {}    # host -> earliest start time of the next request
+
+    def _host_slot(self, host):
+        with self.host_lock:
+            if host not in self.host_slots:
+                self.host_slots[host] = threading.BoundedSemaphore(self.per_host_concurrency)
+            return self.host_slots[host]
+
+    def _wait_turn(self, host):
+        """Reserve the next start slot for `host` and sleep until it arrives."""
+        with self.host_lock:
+            now = time.monotonic()
+            start = max(now, self.host_next.get(host, now))
+            self.host_next[host] = start + self.per_host_interval
+        if start > now:
+            time.sleep(start - now)
+
+    def fetch(self, url, **kwargs):
+        """GET through the shared session, honouring per-host limits."""
+        host = urlparse(url).netloc
+        with self._host_slot(host):
+            self._wait_turn(host)
+            return self.session.get(url, timeout=self.timeout, **kwargs)
+
+    def iter_scrape(self, urls, deadline=None):
+        """Scrape URLs concurrently, yielding (index, result) as each finishes.
+
+        Only a couple of URLs per worker are in flight at a time and each
+        result is released once yielded, so memory does not grow with the
+        length of `urls`. URLs not finished when `deadline` seconds have
+        passed are reported as timed out.
+        """
+        todo = iter(enumerate(urls))
+        running = {}  # future -> (index, url)
+        window = self.workers * 2
+        stop_at = time.monotonic() + deadline if deadline else None
+
+        while True:
+            if stop_at is None or time.monotonic() < stop_at:
+                for i, url in islice(todo, window - len(running)):
+                    running[self.pool.submit(self.scrape_url, url)] = (i, url)
+            if not running:
+                break
+            timeout = max(0, stop_at - time.monotonic()) if stop_at else None
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            while done:
+                future = done.pop()
+                i, _ = running.pop(future)
+                yield i, future.result()
+                del future
+
+        # Deadline reached: anything finished still gets its real result
+        for future, (i, url) in running.items():
+            if future.done():
+                yield i, future.result()
+            else:
+                future.cancel()
+                yield i, {'success': False, 'error': 'Timed out', 'url': url}
+        for i, url in todo:
+            yield i, {'success': False, 'error': 'Timed out', 'url': url}
+
+    def scrape_many(self, urls, deadline=None):
+        """Scrape URLs concurrently; results are returned in input order."""
+        results = [None] * len(urls)
+        for i, res in self.iter_scrape(urls, deadline):
+            results[i] = res
+        return results
     
-    def scrape_url(self, url):
-        """Scrape a single URL and extract structured data."""
+    def scrape_url(self, url, with_outlinks=False):
+        """Scrape a single URL and extract structured data.
+
+        'cache' in the result is 'fresh' (served from disk), 'revalidated'
+        (server answered 304, nothing parsed) or 'miss'. With
+        `with_outlinks`, the result also carries every followable link.
+        """
         try:
-            response = requests.get(url, headers=self.headers, timeout=15)
+            entry = self.cache.get(url) if self.cache else None
+            if entry and with_outlinks and 'outlinks' not in entry:
+                entry = None  # cached before outlinks were stored
+            if entry and self.cache.is_fresh(entry):
+                return self._result(entry['data'], entry.get('outlinks'), with_outlinks, 'fresh')
+
+            headers = {}
+            if entry and entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry and entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+            response = self.fetch(url, headers=headers)
+            if response.status_code == 304 and entry:
+                self.cache.revalidated(url, entry)
+                return self._result(entry['data'], entry.get('outlinks'), with_outlinks, 'revalidated')
             response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, 'lxml')
-            
-            # Clean up DOM
-            for tag in soup(["script", "style", "nav", "footer", "iframe", "noscript"]):
-                tag.decompose()
-            
-            # Extract
-            data = {
-                'url': url,
-                'title': soup.title.string.strip() if soup.title else 'No Title Found',
-                'headings': self._extract_headings(soup),
-                'paragraphs': self._extract_paragraphs(soup),
-                'links': self._extract_links(soup, url),
-                'images': self._extract_images(soup, url),
-                'meta_description': self._get_meta_description(soup),
-                'text_content': soup.get_text(separator=' ', strip=True),
-                'scraped_at': datetime.now().isoformat()
-            }
-            
-            return {'success': True, 'data': data}
+
+            data = self.extract(response.content, url)
+            outlinks = data.pop('outlinks')
+            if self.cache:
+                self.cache.put(url, data, response.headers, outlinks)
+            return self._result(data, outlinks, with_outlinks, 'miss')
         
         except Exception as e:
             return {'success': False, 'error': str(e)}
+
+    @staticmethod
+    def _result(data, outlinks, with_outlinks, cache):
+        result = {'success': True, 'data': data, 'cached': cache != 'miss', 'cache': cache}
+        if with_outlinks:
+            result['outlinks'] = outlinks or []
+        return result
+
+    def extract(self, content, url):
+        """Parse an HTML document into the scraper's `data` dict (plus 'outlinks')."""
+        if self.parser == 'fast':
+            return extract_fast(content, url)
+        return self.extract_with_soup(content, url)
+
+    def extract_with_soup(self, content, url):
+        """Reference BeautifulSoup extraction (one tree walk per field)."""
+        soup = BeautifulSoup(content, 'lxml')
+        outlinks = [t for t in (outlink(url, a['href']) for a in soup.find_all('a', href=True)) if t]
+
+        # Clean up DOM
+        for tag in soup(["script", "style", "nav", "footer", "iframe", "noscript"]):
+            tag.decompose()
+
+        # Extract
+        return {
+            'url': url,
+            'title': soup.title.string.strip() if soup.title else 'No Title Found',
+            'headings': self._extract_headings(soup),
+            'paragraphs': self._extract_paragraphs(soup),
+            'links': self._extract_links(soup, url),
+            'images': self._extract_images(soup, url),
+            'meta_description': self._get_meta_description(soup),
+            'text_content': soup.get_text(separator=' ', strip=True),
+            'scraped_at': datetime.now().isoformat(),
+            'outlinks': outlinks[:PageExtractor.MAX_OUTLINKS]
+        }
     
     def _extract_headings(self, soup):
         headings = {}
@@ -101,7 +507,148 @@ class WebScraper:
         ]
         return {'success': True, 'results': simulated_results}
 
+def normalize_url(url):
+    """Canonical form used for crawl dedup: lowercase scheme/host, no default
+    port, no fragment, '/' for an empty path."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    port = parts.port
+    if port and (scheme, port) not in (('http', 80), ('https', 443)):
+        host = f"{host}:{port}"
+    return urlunsplit((scheme, host, parts.path or '/', parts.query, ''))
+
+class BloomFilter:
+    """Fixed-size probabilistic set; false positives only (a URL may be skipped
+    wrongly with probability ~error_rate, never fetched twice)."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        """Add `item`; returns False if it was (probably) already present."""
+        new = False
+        for pos in self._positions(item):
+            byte, bit = divmod(pos, 8)
+            if not self.bits[byte] & (1 << bit):
+                self.bits[byte] |= 1 << bit
+                new = True
+        return new
+
+    def __contains__(self, item):
+        return all(self.bits[pos // 8] & (1 << (pos % 8)) for pos in self._positions(item))
+
+class Crawler:
+    """Breadth-first crawl from a seed over the scraper's pooled, polite fetcher."""
+
+    def __init__(self, scraper, seen_capacity=100000):
+        self.scraper = scraper
+        self.seen_capacity = seen_capacity
+
+    def crawl(self, seed, max_depth=2, max_pages=50, same_host=True, deadline=None):
+        """Yield (url, depth, result) for each page as soon as it is scraped."""
+        seed = normalize_url(seed)
+        seed_host = urlsplit(seed).netloc
+        seen = BloomFilter(self.seen_capacity)
+        seen.add(seed)
+        frontier = deque([(seed, 0)])
+        running = {}
+        submitted = 0
+        stop_at = time.monotonic() + deadline if deadline else None
+
+        while frontier or running:
+            # Keep the worker pool busy, in FIFO (breadth-first) order
+            while frontier and submitted < max_pages and len(running) < self.scraper.workers:
+                url, depth = frontier.popleft()
+                running[self.scraper.pool.submit(self.scraper.scrape_url, url, with_outlinks=True)] = (url, depth)
+                submitted += 1
+            if not running:
+                break
+            timeout = max(0, stop_at - time.monotonic()) if stop_at else None
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                for future, (url, depth) in running.items():
+                    future.cancel()
+                    yield url, depth, {'success': False, 'error': 'Timed out'}
+                return
+            for future in done:
+                url, depth = running.pop(future)
+                result = future.result()
+                if result['success'] and depth < max_depth:
+                    for link in result['outlinks']:
+                        try:
+                            link = normalize_url(link)
+                        except ValueError:
+                            continue  # malformed port, e.g. http://host:abc/
+                        if same_host and urlsplit(link).netloc != seed_host:
+                            continue
+                        if seen.add(link):
+                            frontier.append((link, depth + 1))
+                yield url, depth, result
+
+class MinHasher:
+    """MinHash signatures of word shingles, using (a*x + b) mod p permutations."""
+
+    PRIME = 4294967311  # smallest prime above 2**32
+
+    def __init__(self, num_perm=128, shingle_size=5, seed=1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        # a, b, x < 2**32 keeps a*x + b inside uint64
+        self.a = rng.integers(1, 2 ** 32, num_perm, dtype=np.uint64)[:, np.newaxis]
+        self.b = rng.integers(0, 2 ** 32, num_perm, dtype=np.uint64)[:, np.newaxis]
+
+    def shingles(self, text):
+        words = text.lower().split()
+        k = self.shingle_size
+        if len(words) < k:
+            return {zlib.crc32(' '.join(words).encode())} if words else set()
+        return {zlib.crc32(' '.join(words[i:i + k]).encode()) for i in range(len(words) - k + 1)}
+
+    def signature(self, text):
+        """uint32 signature of `text`, or None when it has no words."""
+        hashes = np.fromiter(self.shingles(text), dtype=np.uint64)
+        if not len(hashes):
+            return None
+        sig = np.full(self.num_perm, self.PRIME, dtype=np.uint64)
+        for start in range(0, len(hashes), 4096):  # bounds the (num_perm, n) temporary
+            x = hashes[start:start + 4096]
+            np.minimum(sig, ((self.a * x + self.b) % self.PRIME).min(axis=1), out=sig)
+        return sig.astype(np.uint32)
+
+class LSHIndex:
+    """Banded LSH over MinHash signatures; returns candidates at insert time."""
+
+    def __init__(self, bands, rows):
+        self.bands = bands
+        self.rows = rows
+        self.buckets = defaultdict(list)
+
+    def add(self, key, sig):
+        candidates = set()
+        for band in range(self.bands):
+            bucket = self.buckets[(band, sig[band * self.rows:(band + 1) * self.rows].tobytes())]
+            candidates.update(bucket)
+            bucket.append(key)
+        return candidates
+
 class LLMProcessor:
+    def __init__(self, num_perm=128, bands=16, shingle_size=5, threshold=0.8, max_pairs=100):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.hasher = MinHasher(num_perm, shingle_size)
+        self.bands = bands
+        self.threshold = threshold
+        self.max_pairs = max_pairs
+
     def summarize_content(self, data):
         """Simple rule-based summarizer (Mock LLM)."""
         text = data.get('text_content', '')
@@ -125,13 +672,94 @@ class LLMProcessor:
         }
     
     def compare_content(self, results_list):
+        comparison = self.new_comparison()
+        for data in results_list:
+            comparison.add(data)
+        return comparison.result()
+
+    def new_comparison(self):
+        return ContentComparison(self.hasher, self.bands, self.threshold, self.max_pairs)
+
+class ContentComparison:
+    """Running form of compare_content, so results need not be kept in memory.
+
+    Each page's text is reduced to a MinHash signature and looked up in an
+    LSH index, so near-duplicates are found without comparing every pair.
+    """
+
+    def __init__(self, hasher, bands, threshold, max_pairs):
+        self.total_processed = 0
+        self.total_length = 0
+        self.hasher = hasher
+        self.threshold = threshold
+        self.max_pairs = max_pairs
+        self.lsh = LSHIndex(bands, hasher.num_perm // bands)
+        self.signatures = []  # index -> signature
+        self.urls = []
+        self.pairs = []       # (similarity, i, j)
+
+    def add(self, data):
+        self.total_processed += 1
+        text = data.get('text_content', '')
+        self.total_length += len(text)
+
+        sig = self.hasher.signature(text)
+        if sig is None:
+            return
+        idx = len(self.signatures)
+        self.signatures.append(sig)
+        self.urls.append(data.get('url', str(self.total_processed - 1)))
+        for other in self.lsh.add(idx, sig):
+            similarity = float(np.mean(self.signatures[other] == sig))
+            if similarity >= self.threshold:
+                self.pairs.append((similarity, other, idx))
+
+    def _clusters(self):
+        parent = list(range(len(self.signatures)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for _, i, j in self.pairs:
+            parent[find(i)] = find(j)
+        groups = defaultdict(list)
+        for i in range(len(parent)):
+            groups[find(i)].append(self.urls[i])
+        return [g for g in groups.values() if len(g) > 1]
+
+    def result(self):
+        top = sorted(self.pairs, reverse=True)[:self.max_pairs]
         return {
-            'total_processed': len(results_list),
-            'avg_length': sum(len(r.get('text_content', '')) for r in results_list) // max(1, len(results_list))
+            'total_processed': self.total_processed,
+            'avg_length': self.total_length // max(1, self.total_processed),
+            'near_duplicates': {
+                'clusters': self._clusters(),
+                'pairs': [{'a': self.urls[i], 'b': self.urls[j], 'similarity': round(sim, 3)}
+                          for sim, i, j in top],
+                'total_pairs': len(self.pairs),
+                'threshold': self.threshold
+            }
         }
 
-scraper = WebScraper()
-processor = LLMProcessor()
+scraper = WebScraper(workers=app.config['SCRAPE_WORKERS'],
+                     per_host_concurrency=app.config['PER_HOST_CONCURRENCY'],
+                     per_host_interval=app.config['PER_HOST_INTERVAL'],
+                     timeout=app.config['REQUEST_TIMEOUT'],
+                     pool_size=app.config['POOL_SIZE'],
+                     parser=app.config['SCRAPE_PARSER'],
+                     cache=ScrapeCache(app.config['SCRAPE_CACHE_DIR'],
+                                       fresh_seconds=app.config['SCRAPE_CACHE_FRESH'],
+                                       max_age=app.config['SCRAPE_CACHE_MAX_AGE'],
+                                       max_bytes=app.config['SCRAPE_CACHE_MAX_BYTES']))
+processor = LLMProcessor(num_perm=app.config['DEDUP_NUM_PERM'],
+                         bands=app.config['DEDUP_BANDS'],
+                         shingle_size=app.config['DEDUP_SHINGLE_SIZE'],
+                         threshold=app.config['DEDUP_THRESHOLD'],
+                         max_pairs=app.config['DEDUP_MAX_PAIRS'])
+crawler = Crawler(scraper, seen_capacity=app.config['CRAWL_SEEN_CAPACITY'])
 
 # --- Routes ---
 
@@ -170,20 +798,74 @@ def search_scrape():
 @app.route('/api/batch-scrape', methods=['POST'])
 def batch_scrape():
     urls = request.json.get('urls', [])
-    results = []
-    
-    for url in urls[:5]: # Limit to 5
-        res = scraper.scrape_url(url)
+    if request.json.get('stream'):
+        # Streaming holds only a MinHash signature per page, so it takes more
+        limit = app.config['BATCH_STREAM_MAX_URLS']
+        return Response(stream_batch(urls[:limit], len(urls) > limit),
+                        mimetype='application/x-ndjson')
+    limit = app.config['BATCH_MAX_URLS']
+
+    # Fetched concurrently; politeness is handled per host by the scraper
+    results = scraper.scrape_many(urls[:limit], deadline=app.config['BATCH_TIMEOUT'])
+    for res in results:
         if res['success']:
             res['summary'] = processor.summarize_content(res['data'])
-        results.append(res)
-        time.sleep(0.5)
         
     return jsonify({
         'success': True, 
         'results': results,
+        'truncated': len(urls) > limit,
         'comparison': processor.compare_content([r['data'] for r in results if r['success']])
     })
 
+@app.route('/api/crawl', methods=['POST'])
+def crawl():
+    """Breadth-first crawl from 'seed', streamed as NDJSON page records."""
+    body = request.json
+    seed = body.get('seed') or body.get('url')
+    if not seed or not seed.startswith(('http://', 'https://')):
+        return jsonify({'success': False, 'error': 'http(s) seed URL required'}), 400
+    try:
+        normalize_url(seed)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid seed URL'}), 400
+    try:
+        max_depth = int(body.get('max_depth', 1))
+        max_pages = int(body.get('max_pages', 20))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'max_depth and max_pages must be integers'}), 400
+    max_depth = min(max(max_depth, 0), app.config['CRAWL_MAX_DEPTH'])
+    max_pages = min(max(max_pages, 1), app.config['CRAWL_MAX_PAGES'])
+    same_host = body.get('same_host', True)
+    if isinstance(same_host, str):
+        same_host = same_host.strip().lower() not in ('false', '0', 'no', 'off')
+    same_host = bool(same_host)
+
+    def generate():
+        pages = failed = 0
+        for url, depth, res in crawler.crawl(seed, max_depth, max_pages, same_host,
+                                             deadline=app.config['CRAWL_TIMEOUT']):
+            pages += 1
+            if res['success']:
+                res['summary'] = processor.summarize_content(res['data'])
+                res['outlinks_found'] = len(res.pop('outlinks'))
+            else:
+                failed += 1
+            yield json.dumps({'type': 'page', 'url': url, 'depth': depth, **res}) + '\n'
+        yield json.dumps({'type': 'done', 'success': True, 'pages': pages, 'failed': failed}) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+def stream_batch(urls, truncated):
+    """NDJSON: one 'result' line per URL as it completes, then a 'comparison' line."""
+    comparison = processor.new_comparison()
+    for index, res in scraper.iter_scrape(urls, deadline=app.config['BATCH_TIMEOUT']):
+        if res['success']:
+            res['summary'] = processor.summarize_content(res['data'])
+            comparison.add(res['data'])
+        yield json.dumps({'type': 'result', 'index': index, **res}) + '\n'
+    yield json.dumps({'type': 'comparison', 'success': True, 'truncated': truncated,
+                      'comparison': comparison.result()}) + '\n'
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
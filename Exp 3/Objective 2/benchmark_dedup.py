@@ -0,0 +1,85 @@
+"""Benchmark MinHash/LSH near-duplicate detection in compare_content.
+
+Builds a synthetic batch in which some pages are lightly edited copies of
+others, then reports the runtime, and the recall and precision against exact
+shingle Jaccard (checked by brute force on a sample of pages).
+
+Usage:
+    python benchmark_dedup.py [num_docs ...]
+    python benchmark_dedup.py 5000 --bands 32 --threshold 0.7
+"""
+import argparse
+import random
+import time
+
+from app import LLMProcessor
+
+
+def synthetic_docs(n, dup_fraction=0.2, words_per_doc=300, edit_rate=0.01, seed=7):
+    rng = random.Random(seed)
+    vocab = [f"w{i}" for i in range(20000)]
+    docs = []
+    for i in range(n):
+        if docs and rng.random() < dup_fraction:
+            words = rng.choice(docs)['text_content'].split()
+            for k in range(len(words)):
+                if rng.random() < edit_rate:
+                    words[k] = rng.choice(vocab)
+        else:
+            words = [rng.choice(vocab) for _ in range(words_per_doc)]
+        docs.append({'url': f"https://example.com/{i}", 'text_content': ' '.join(words)})
+    return docs
+
+
+def exact_pairs(docs, processor, threshold):
+    shingles = [processor.hasher.shingles(d['text_content']) for d in docs]
+    pairs = set()
+    for i in range(len(docs)):
+        for j in range(i + 1, len(docs)):
+            union = len(shingles[i] | shingles[j])
+            if union and len(shingles[i] & shingles[j]) / union >= threshold:
+                pairs.add((docs[i]['url'], docs[j]['url']))
+    return pairs
+
+
+def run(n, args):
+    processor = LLMProcessor(num_perm=args.num_perm, bands=args.bands,
+                             shingle_size=args.shingle_size, threshold=args.threshold,
+                             max_pairs=10 ** 9)
+    docs = synthetic_docs(n)
+
+    started = time.perf_counter()
+    result = processor.compare_content(docs)
+    elapsed = time.perf_counter() - started
+    dup = result['near_duplicates']
+
+    sample = docs[:args.sample]
+    sample_urls = {d['url'] for d in sample}
+    started = time.perf_counter()
+    truth = exact_pairs(sample, processor, args.threshold)
+    brute = time.perf_counter() - started
+    found = {tuple(sorted((p['a'], p['b']))) for p in dup['pairs']
+             if p['a'] in sample_urls and p['b'] in sample_urls}
+    truth = {tuple(sorted(p)) for p in truth}
+    recall = len(found & truth) / len(truth) if truth else 1.0
+    precision = len(found & truth) / len(found) if found else 1.0
+    # Brute force is O(n^2): scale the sample time up to the full batch
+    brute_full = brute * (n * (n - 1)) / max(1, len(sample) * (len(sample) - 1))
+
+    print(f"{n:>6} docs  minhash+lsh {elapsed:7.2f} s  ({elapsed / n * 1000:.2f} ms/doc)  "
+          f"pairs {dup['total_pairs']:>6}  clusters {len(dup['clusters']):>5}  "
+          f"| sample of {len(sample)}: recall {recall:.3f} precision {precision:.3f}  "
+          f"| exact O(n^2) est. {brute_full:8.1f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("sizes", nargs="*", type=int, default=[1000, 2000, 5000])
+    parser.add_argument("--num-perm", type=int, default=128)
+    parser.add_argument("--bands", type=int, default=16)
+    parser.add_argument("--shingle-size", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--sample", type=int, default=400)
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args)
@@ -0,0 +1,65 @@
+"""Compare the single-pass extractor with the BeautifulSoup path.
+
+Usage:
+    python benchmark_extract.py              # synthetic pages of several sizes
+    python benchmark_extract.py page.html    # your own saved pages
+"""
+import sys
+import time
+
+from app import WebScraper, extract_fast
+
+SECTION = """
+<div class="section">
+  <h2>Section {i} heading</h2>
+  <p>Paragraph {i}: the quick brown fox jumps over the lazy dog, again and again.</p>
+  <p>Short {i}</p>
+  <h3>Sub <b>heading</b> {i}</h3>
+  <ul><li><a href="/page/{i}">Link {i}</a></li><li><a href="#top">Top</a></li></ul>
+  <img src="/img/{i}.png" alt="Image {i}">
+  <nav><a href="/nav/{i}">Nav link</a></nav>
+  <script>var x = {i};</script>
+  <!-- comment {i} -->
+</div>
+"""
+
+
+def synthetic_page(sections):
+    body = "".join(SECTION.format(i=i) for i in range(sections))
+    return ("<html><head><title> Benchmark page </title>"
+            "<meta name=\"description\" content=\"Synthetic benchmark page\"></head>"
+            f"<body><h1>Benchmark</h1>{body}<footer>Footer text</footer></body></html>").encode()
+
+
+def strip_time(data):
+    return {k: v for k, v in data.items() if k != 'scraped_at'}
+
+
+def bench(name, content, url="https://example.com/", repeat=5):
+    scraper = WebScraper(workers=1)
+    soup_data = scraper.extract_with_soup(content, url)
+    fast_data = extract_fast(content, url)
+    same = strip_time(soup_data) == strip_time(fast_data)
+
+    timings = {}
+    for label, fn in (("soup", scraper.extract_with_soup), ("fast", extract_fast)):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            fn(content, url)
+        timings[label] = (time.perf_counter() - started) / repeat
+
+    print(f"{name:>24}  {len(content) / 1024:9.0f} KB  soup {timings['soup'] * 1000:8.1f} ms  "
+          f"fast {timings['fast'] * 1000:8.1f} ms  x{timings['soup'] / timings['fast']:.1f}  "
+          f"{'same output' if same else 'OUTPUT DIFFERS'}")
+    return same
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        results = []
+        for path in sys.argv[1:]:
+            with open(path, "rb") as f:
+                results.append(bench(path, f.read()))
+    else:
+        results = [bench(f"{n} sections", synthetic_page(n)) for n in (100, 1000, 10000)]
+    sys.exit(0 if all(results) else 1)
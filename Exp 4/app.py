@@ -1,5 +1,17 @@
+import base64
+import csv
+import hashlib
+import hmac
+import io
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
 from flask import Flask, render_template, request, redirect, session
-from flask_mysqldb import MySQL
 
 app = Flask(__name__)
 app.secret_key = "secret"
@@ -10,7 +22,305 @@ app.config["MYSQL_USER"] = "root"
 app.config["MYSQL_PASSWORD"] = "Shivansh@123"   # change if needed
 app.config["MYSQL_DB"] = "flaskdb"
 
-mysql = MySQL(app)
+# Data access: "mysql", or "sqlite" to run the same flows against a local file
+app.config["DB_BACKEND"] = "mysql"
+app.config["SQLITE_PATH"] = "flaskdb.sqlite3"   # ":memory:" works too (pool size 1)
+app.config["DB_POOL_SIZE"] = 5
+app.config["DB_POOL_TIMEOUT"] = 5               # seconds to wait for a free connection
+app.config["DB_SLOW_QUERY_MS"] = 200            # queries slower than this are logged
+
+app.config["DASHBOARD_CACHE_TTL"] = 300         # seconds a user's dashboard data is reused
+app.config["IMPORT_BATCH_ROWS"] = 1000          # CSV rows per executemany batch
+app.config["IMPORT_COMMIT_BATCHES"] = 5         # batches per commit
+# User ids allowed to bulk import, e.g. FLASK_ADMIN_USER_IDS=1,7. Ids rather than
+# usernames, since anyone can sign up under a name that is not taken yet.
+app.config["ADMIN_USER_IDS"] = {int(uid) for uid in os.environ.get("FLASK_ADMIN_USER_IDS", "").split(",")
+                                if uid.strip()}
+
+# Password hashing (PBKDF2-SHA256); raising the cost rehashes users as they log in.
+# MySQL: the password column must hold ~100 characters, e.g. VARCHAR(128).
+app.config["PASSWORD_HASH_ITERATIONS"] = 200_000
+app.config["PASSWORD_HASH_WORKERS"] = 4         # concurrent hashes; bounds CPU per process
+app.config["PASSWORD_HASH_TIMEOUT"] = 10        # seconds to wait for a worker
+
+
+# ---------------- DATA ACCESS ----------------
+class ConnectionPool:
+    """Bounded pool; connections are opened lazily up to `size`."""
+
+    def __init__(self, connect, size=5, timeout=5, check=None):
+        self.connect = connect
+        self.check = check  # liveness test run on idle connections at checkout
+        self.timeout = timeout
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+
+    def _alive(self, conn):
+        """`conn` if it still answers, else a fresh one (e.g. after wait_timeout)."""
+        if self.check is None:
+            return conn
+        try:
+            self.check(conn)
+            return conn
+        except Exception:
+            try:
+                conn.close()
+            except Exception:
+                pass
+            return self.connect()
+
+    @contextmanager
+    def connection(self):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise RuntimeError("Database connection pool exhausted")
+        try:
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                conn = self.connect()
+            else:
+                conn = self._alive(conn)
+            try:
+                yield conn
+            finally:
+                # Always end the transaction before reuse: with autocommit off, a
+                # plain SELECT under REPEATABLE READ would otherwise pin its
+                # snapshot and later users of this connection would miss new rows.
+                # Drop the connection if it is no longer usable.
+                try:
+                    conn.rollback()
+                except Exception:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                    conn = None
+                if conn is not None:
+                    self.idle.put(conn)
+        finally:
+            self.slots.release()
+
+
+class Database:
+    """Small query layer: pooled connections, closed cursors, timing hooks.
+
+    SQL is written once with %s placeholders and translated to the driver's
+    style; the translation is cached per statement.
+    """
+
+    def __init__(self, pool, placeholder="%s"):
+        self.pool = pool
+        self.placeholder = placeholder
+        self.hooks = []  # callables (sql, params, seconds)
+        self.statements = {}
+
+    def _statement(self, sql):
+        stmt = self.statements.get(sql)
+        if stmt is None:
+            stmt = sql if self.placeholder == "%s" else sql.replace("%s", self.placeholder)
+            self.statements[sql] = stmt
+        return stmt
+
+    def _run(self, conn, sql, params, fetch):
+        started = time.perf_counter()
+        cur = conn.cursor()
+        try:
+            cur.execute(self._statement(sql), params)
+            return fetch(cur)
+        finally:
+            cur.close()
+            for hook in self.hooks:
+                hook(sql, params, time.perf_counter() - started)
+
+    def query_one(self, sql, params=()):
+        with self.pool.connection() as conn:
+            return self._run(conn, sql, params, lambda cur: cur.fetchone())
+
+    def query_all(self, sql, params=()):
+        with self.pool.connection() as conn:
+            return self._run(conn, sql, params, lambda cur: cur.fetchall())
+
+    def execute(self, sql, params=()):
+        """Run a write and commit; returns the affected row count."""
+        with self.pool.connection() as conn:
+            count = self._run(conn, sql, params, lambda cur: cur.rowcount)
+            conn.commit()
+            return count
+
+    @contextmanager
+    def transaction(self):
+        """Hold one pooled connection for several statements; the caller commits."""
+        with self.pool.connection() as conn:
+            yield Transaction(self, conn)
+            conn.commit()
+
+
+class Transaction:
+    def __init__(self, database, conn):
+        self.database = database
+        self.conn = conn
+
+    def query_all(self, sql, params=()):
+        return self.database._run(self.conn, sql, params, lambda cur: cur.fetchall())
+
+    def executemany(self, sql, rows):
+        if not rows:
+            return 0
+        started = time.perf_counter()
+        cur = self.conn.cursor()
+        try:
+            cur.executemany(self.database._statement(sql), rows)
+            return cur.rowcount
+        finally:
+            cur.close()
+            for hook in self.database.hooks:
+                hook(sql, None, time.perf_counter() - started)
+
+    def commit(self):
+        self.conn.commit()
+
+
+def mysql_connect():
+    import MySQLdb
+    return MySQLdb.connect(host=app.config["MYSQL_HOST"], user=app.config["MYSQL_USER"],
+                           passwd=app.config["MYSQL_PASSWORD"], db=app.config["MYSQL_DB"])
+
+
+def sqlite_connect():
+    conn = sqlite3.connect(app.config["SQLITE_PATH"], check_same_thread=False,
+                           cached_statements=256)
+    conn.executescript(
+        "CREATE TABLE IF NOT EXISTS users ("
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE, password TEXT);"
+        "CREATE TABLE IF NOT EXISTS grades ("
+        "user_id INTEGER REFERENCES users(id), marks INTEGER);"
+    )
+    return conn
+
+
+def create_db():
+    sqlite = app.config["DB_BACKEND"] == "sqlite"
+    pool = ConnectionPool(sqlite_connect if sqlite else mysql_connect,
+                          size=app.config["DB_POOL_SIZE"],
+                          timeout=app.config["DB_POOL_TIMEOUT"],
+                          # MySQL drops idle connections after wait_timeout
+                          check=None if sqlite else lambda conn: conn.ping())
+    database = Database(pool, placeholder="?" if sqlite else "%s")
+    database.hooks.append(log_slow_query)
+    return database
+
+
+query_stats = {"queries": 0, "total_ms": 0.0, "slow": 0}
+stats_lock = threading.Lock()
+
+
+def log_slow_query(sql, params, seconds):
+    ms = seconds * 1000
+    with stats_lock:
+        query_stats["queries"] += 1
+        query_stats["total_ms"] += ms
+        if ms > app.config["DB_SLOW_QUERY_MS"]:
+            query_stats["slow"] += 1
+    if ms > app.config["DB_SLOW_QUERY_MS"]:
+        app.logger.warning("Slow query (%.1f ms): %s", ms, sql)
+
+
+db = create_db()
+
+
+# ---------------- DASHBOARD CACHE ----------------
+class DashboardCache:
+    """Read-through per-user cache, invalidated when grades or passwords change."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.entries = {}  # user id -> (value, stored at)
+        self.lock = threading.Lock()
+
+    def get(self, user_id, load):
+        now = time.time()
+        with self.lock:
+            hit = self.entries.get(user_id)
+        if hit and now - hit[1] <= self.ttl:
+            return hit[0]
+        value = load()
+        with self.lock:
+            self.entries[user_id] = (value, now)
+        return value
+
+    def invalidate(self, *user_ids):
+        with self.lock:
+            for user_id in user_ids:
+                self.entries.pop(user_id, None)
+
+
+dashboard_cache = DashboardCache(app.config["DASHBOARD_CACHE_TTL"])
+
+
+# ---------------- PASSWORD HASHING ----------------
+class PasswordHasher:
+    """Salted PBKDF2 hashes computed on a bounded thread pool.
+
+    hashlib releases the GIL while hashing, so the pool keeps request
+    threads from stalling while capping how many hashes run at once.
+    Stored format: pbkdf2_sha256$<iterations>$<salt>$<hash>.
+    Rows that predate hashing hold the plaintext and are still accepted.
+    """
+
+    algorithm = "pbkdf2_sha256"
+
+    def __init__(self, iterations, workers=4, timeout=10):
+        self.iterations = iterations
+        self.timeout = timeout
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pwhash")
+        self.dummy = None
+
+    @staticmethod
+    def _b64(raw):
+        return base64.b64encode(raw).decode().rstrip("=")
+
+    def _derive(self, password, salt, iterations):
+        return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+
+    def _hash(self, password):
+        salt = os.urandom(16)
+        digest = self._derive(password, salt, self.iterations)
+        return f"{self.algorithm}${self.iterations}${self._b64(salt)}${self._b64(digest)}"
+
+    def _verify(self, password, stored):
+        parts = stored.split("$")
+        if len(parts) != 4 or parts[0] != self.algorithm:
+            return hmac.compare_digest(password.encode(), stored.encode()), True
+        iterations = int(parts[1])
+        salt = base64.b64decode(parts[2] + "=" * (-len(parts[2]) % 4))
+        digest = self._b64(self._derive(password, salt, iterations))
+        return hmac.compare_digest(digest, parts[3]), iterations != self.iterations
+
+    def hash(self, password):
+        return self.pool.submit(self._hash, password).result(self.timeout)
+
+    def hash_many(self, passwords):
+        if not passwords:
+            return []
+        return list(self.pool.map(self._hash, passwords, timeout=self.timeout * len(passwords)))
+
+    def verify(self, password, stored):
+        """Return (matches, needs_rehash)."""
+        return self.pool.submit(self._verify, password, stored).result(self.timeout)
+
+    def verify_missing(self, password):
+        """Spend a verify's worth of time for an unknown user, so timing doesn't
+        reveal which usernames exist."""
+        if self.dummy is None:
+            self.dummy = self.hash("")
+        self.verify(password, self.dummy)
+        return False, False
+
+
+hasher = PasswordHasher(app.config["PASSWORD_HASH_ITERATIONS"],
+                        workers=app.config["PASSWORD_HASH_WORKERS"],
+                        timeout=app.config["PASSWORD_HASH_TIMEOUT"])
+
 
 # ---------------- LOGIN ----------------
 @app.route("/", methods=["GET", "POST"])
@@ -19,11 +329,16 @@ def login():
         username = request.form["username"]
         password = request.form["password"]
 
-        cur = mysql.connection.cursor()
-        cur.execute("SELECT id, password FROM users WHERE username=%s", (username,))
-        user = cur.fetchone()
+        user = db.query_one("SELECT id, password FROM users WHERE username=%s", (username,))
 
-        if user and user[1] == password:
+        if user:
+            ok, stale = hasher.verify(password, user[1])
+        else:
+            ok, stale = hasher.verify_missing(password)
+        if ok:
+            if stale:
+                db.execute("UPDATE users SET password=%s WHERE id=%s",
+                           (hasher.hash(password), user[0]))
             session["user_id"] = user[0]
             return redirect("/dashboard")
 
@@ -35,13 +350,16 @@ def login():
 # ---------------- SIGNUP ----------------
 @app.route("/signup", methods=["POST"])
 def signup():
-    username = request.form["username"]
+    username = request.form["username"].strip()
     password = request.form["password"]
 
-    cur = mysql.connection.cursor()
-    cur.execute("INSERT INTO users(username,password) VALUES(%s,%s)",
-                (username, password))
-    mysql.connection.commit()
+    if not username or not password:
+        return "Username and password are required", 400
+    if db.query_one("SELECT id FROM users WHERE username=%s", (username,)):
+        return "Username already taken", 409
+
+    db.execute("INSERT INTO users(username,password) VALUES(%s,%s)",
+               (username, hasher.hash(password)))
 
     return redirect("/")
 
@@ -52,10 +370,9 @@ def dashboard():
     if "user_id" not in session:
         return redirect("/")
 
-    cur = mysql.connection.cursor()
-    cur.execute("SELECT marks FROM grades WHERE user_id=%s",
-                (session["user_id"],))
-    grade = cur.fetchone()
+    user_id = session["user_id"]
+    grade = dashboard_cache.get(user_id, lambda: db.query_one(
+        "SELECT marks FROM grades WHERE user_id=%s", (user_id,)))
 
     return render_template("dashboard.html", grade=grade)
 
@@ -68,14 +385,128 @@ def reset():
 
     new_password = request.form["password"]
 
-    cur = mysql.connection.cursor()
-    cur.execute("UPDATE users SET password=%s WHERE id=%s",
-                (new_password, session["user_id"]))
-    mysql.connection.commit()
+    db.execute("UPDATE users SET password=%s WHERE id=%s",
+               (hasher.hash(new_password), session["user_id"]))
+    dashboard_cache.invalidate(session["user_id"])
 
     return redirect("/dashboard")
 
 
+# ---------------- BULK IMPORT ----------------
+def clean_row(row):
+    """Return (username, password, marks or None), or None for an invalid row."""
+    username = (row.get("username") or "").strip()
+    password = row.get("password") or ""
+    marks = (row.get("marks") or "").strip()
+    if not username or not password.strip():
+        return None
+    if marks:
+        try:
+            marks = int(marks)
+        except ValueError:
+            return None
+    return username, password, marks if marks != "" else None
+
+
+def import_batch(tx, rows):
+    """Create missing users and (re)write grades for one batch of clean rows.
+
+    Returns (users created, ids of users whose grades changed).
+    """
+    names = list(dict.fromkeys(username for username, _, _ in rows))
+    marks = "(" + ",".join(["%s"] * len(names)) + ")"
+    existing = {name for _, name in tx.query_all(
+        f"SELECT id, username FROM users WHERE username IN {marks}", names)}
+
+    new_users = {}
+    for username, password, _ in rows:
+        if username not in existing:
+            new_users.setdefault(username, password)
+    tx.executemany("INSERT INTO users(username,password) VALUES(%s,%s)",
+                   list(zip(new_users, hasher.hash_many(list(new_users.values())))))
+
+    ids = {name: uid for uid, name in tx.query_all(
+        f"SELECT id, username FROM users WHERE username IN {marks}", names)}
+    grades = {ids[username]: grade for username, _, grade in rows if grade is not None}
+    tx.executemany("DELETE FROM grades WHERE user_id=%s", [(uid,) for uid in grades])
+    tx.executemany("INSERT INTO grades(user_id,marks) VALUES(%s,%s)", list(grades.items()))
+    return len(new_users), list(grades)
+
+
+def is_admin(user_id):
+    return user_id in app.config["ADMIN_USER_IDS"]
+
+
+@app.route("/import", methods=["POST"])
+def bulk_import():
+    """Stream a CSV (username,password[,marks]) into users and grades. Admins only."""
+    if "user_id" not in session:
+        return redirect("/")
+    if not is_admin(session["user_id"]):
+        return {"error": "Admins only"}, 403
+    file = request.files.get("file")
+    if not file:
+        return {"error": "CSV file required"}, 400
+
+    reader = csv.DictReader(io.TextIOWrapper(file.stream, encoding="utf-8", newline=""))
+    if not reader.fieldnames or not {"username", "password"} <= set(reader.fieldnames):
+        return {"error": "CSV needs username and password columns"}, 400
+
+    batch_rows = app.config["IMPORT_BATCH_ROWS"]
+    commit_every = app.config["IMPORT_COMMIT_BATCHES"]
+    stats = {"rows": 0, "users_created": 0, "grades_written": 0, "commits": 0,
+             "rejected": 0, "rejected_lines": []}
+    started = time.perf_counter()
+    # Cached dashboards are dropped only once their new grades are committed,
+    # so a concurrent read can't re-cache the old value for a whole TTL
+    uncommitted = []
+
+    def write(tx, batch):
+        created, graded = import_batch(tx, batch)
+        stats["rows"] += len(batch)
+        stats["users_created"] += created
+        stats["grades_written"] += len(graded)
+        uncommitted.extend(graded)
+
+    with db.transaction() as tx:
+        batch, pending = [], 0
+        for row in reader:
+            clean = clean_row(row)
+            if clean is None:
+                stats["rejected"] += 1
+                if len(stats["rejected_lines"]) < 100:
+                    stats["rejected_lines"].append(reader.line_num)
+                continue
+            batch.append(clean)
+            if len(batch) == batch_rows:
+                write(tx, batch)
+                batch, pending = [], pending + 1
+                if pending == commit_every:
+                    tx.commit()
+                    stats["commits"] += 1
+                    dashboard_cache.invalidate(*uncommitted)
+                    uncommitted.clear()
+                    pending = 0
+        if batch:
+            write(tx, batch)
+    stats["commits"] += 1  # final commit when the transaction closes
+    dashboard_cache.invalidate(*uncommitted)
+
+    seconds = time.perf_counter() - started
+    stats["seconds"] = round(seconds, 3)
+    stats["rows_per_second"] = round(stats["rows"] / seconds, 1) if seconds else None
+    return stats
+
+
+# ---------------- DB STATS ----------------
+@app.route("/db/stats")
+def db_stats():
+    with stats_lock:
+        stats = dict(query_stats)
+    stats["avg_ms"] = round(stats["total_ms"] / stats["queries"], 3) if stats["queries"] else 0
+    return stats
+
+
 # ---------------- LOGOUT ----------------
 @app.route("/logout")
 def logout():
@@ -0,0 +1,71 @@
+"""Measure login throughput against the password hash cost.
+
+Runs the login flow through the Flask test client on a throwaway SQLite
+database, with several client threads sharing the app's hashing pool.
+
+Usage:
+    python benchmark_login.py                      # default costs
+    python benchmark_login.py 50000 200000 600000 --workers 4 --clients 16
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import app as auth
+
+
+def setup(path):
+    auth.app.config.update(DB_BACKEND="sqlite", SQLITE_PATH=path)
+    auth.db = auth.create_db()
+    auth.app.test_client().post("/signup", data={"username": "bench", "password": "secret"})
+
+
+def login_loop(count, failures):
+    client = auth.app.test_client()
+    for _ in range(count):
+        r = client.post("/", data={"username": "bench", "password": "secret"})
+        if r.status_code != 302:
+            failures.append(r.status_code)
+
+
+def run(cost, args):
+    auth.hasher = auth.PasswordHasher(cost, workers=args.workers)
+    # First login upgrades the stored hash to this cost
+    auth.app.test_client().post("/", data={"username": "bench", "password": "secret"})
+
+    failures = []
+    per_client = max(1, args.logins // args.clients)
+    threads = [threading.Thread(target=login_loop, args=(per_client, failures))
+               for _ in range(args.clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    total = per_client * args.clients
+
+    stored = auth.db.query_one("SELECT password FROM users WHERE username=%s", ("bench",))[0]
+    print(f"{cost:>9} iterations  {total / elapsed:8.1f} logins/s  "
+          f"{elapsed / total * 1000:7.2f} ms/login  stored cost {stored.split('$')[1]}"
+          f"{'  FAILURES ' + str(len(failures)) if failures else ''}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("costs", nargs="*", type=int, default=[10_000, 50_000, 200_000, 600_000])
+    parser.add_argument("--workers", type=int, default=auth.app.config["PASSWORD_HASH_WORKERS"])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--logins", type=int, default=200)
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix=".sqlite3")
+    os.close(fd)
+    try:
+        setup(path)
+        for cost in args.costs:
+            run(cost, args)
+    finally:
+        os.remove(path)
@@ -1,6 +1,12 @@
+import hashlib
+import hmac
+import re
+import threading
+import time
+from collections import OrderedDict
+
 from flask import Flask, request, jsonify, render_template
 from flask_mysqldb import MySQL
-from google import genai
 
 app = Flask(__name__)
 
@@ -8,9 +14,9 @@ app = Flask(__name__)
 # GEMINI API KEY (PUT YOUR KEY)
 # ==============================
 
-client = genai.Client(
-    api_key=""
-)
+app.config["GEMINI_API_KEY"] = ""
+app.config["GEMINI_MODEL"] = "gemini-2.5-flash"
+app.config["LLM_BACKEND"] = "gemini"            # "stub" answers locally, for tests
 
 # ==============================
 # MYSQL CONFIG
@@ -22,36 +28,390 @@ app.config["MYSQL_USER"] = "root"
 app.config["MYSQL_PASSWORD"] = "Shivansh@123"   # change if needed
 app.config["MYSQL_DB"] = "flaskdb"
 
+# Caching: question -> SQL (per schema version), SQL -> results (short TTL).
+# Nothing tells this app when users/grades change (Exp 4 writes them), so the
+# TTL is the only automatic invalidation: results can be this many seconds stale.
+app.config["SQL_CACHE_SIZE"] = 1024
+app.config["RESULT_CACHE_SIZE"] = 256
+app.config["RESULT_CACHE_TTL"] = 60             # seconds
+# Token for POST /cache/invalidate (X-Cache-Token header); empty disables the route
+app.config["CACHE_INVALIDATE_TOKEN"] = ""
+
+# Result size: rows per response/page, rows shown to the summary prompt,
+# and how many results stay pageable by id
+app.config["RESULT_MAX_ROWS"] = 500
+app.config["SUMMARY_MAX_ROWS"] = 50
+app.config["RESULT_HANDLES"] = 1024
+
+# Cost guard: EXPLAIN each query first and estimate the rows it examines
+app.config["QUERY_ROW_BUDGET"] = 100_000
+# Over budget: "reject" refuses the query; "limit" rewrites it to a small LIMIT
+# page instead, but only when the plan can stop early (no filesort, temporary
+# table or aggregate) since a LIMIT doesn't bound the rows those examine
+app.config["QUERY_OVER_BUDGET"] = "reject"
+app.config["QUERY_OVER_BUDGET_ROWS"] = 50       # page size for rewritten queries
+app.config["QUERY_TIMEOUT_MS"] = 2000           # per-query execution limit
+app.config["QUERY_TIMEOUT_STYLE"] = "auto"      # "mysql" hint, "mariadb" SET STATEMENT, or "auto"
+
 mysql = MySQL(app)
+
+SCHEMA = """users(id PRIMARY KEY, username, password)
+grades(user_id FOREIGN KEY references users(id), marks)"""
+SCHEMA_VERSION = hashlib.sha256(SCHEMA.encode()).hexdigest()[:12]
+TABLES = ("users", "grades")
+
+
+# ==============================
+# LLM CLIENT
+# ==============================
+
+class GeminiLLM:
+    def __init__(self, api_key, model):
+        self.api_key = api_key
+        self.model = model
+        self.client = None
+
+    def generate(self, prompt):
+        if self.client is None:
+            from google import genai
+            self.client = genai.Client(api_key=self.api_key)
+        return self.client.models.generate_content(model=self.model, contents=prompt).text
+
+
+class StubLLM:
+    """Local stand-in for tests: fixed SQL and summary, counts calls."""
+
+    def __init__(self, sql="SELECT COUNT(*) AS total_users FROM users",
+                 summary="This is a stub summary."):
+        self.sql = sql
+        self.summary = summary
+        self.calls = 0
+
+    def generate(self, prompt):
+        self.calls += 1
+        return self.sql if "Return ONLY SQL" in prompt else self.summary
+
+
+def create_llm():
+    if app.config["LLM_BACKEND"] == "stub":
+        return StubLLM()
+    return GeminiLLM(app.config["GEMINI_API_KEY"], app.config["GEMINI_MODEL"])
+
+
+llm = create_llm()
+
+
+# ==============================
+# QUERY CACHE
+# ==============================
+
+def normalize_question(question):
+    return re.sub(r"\s+", " ", question).strip().rstrip("?.! ").lower()
+
+
+def tables_in(sql):
+    return {t for t in TABLES if re.search(rf"\b{t}\b", sql, re.IGNORECASE)}
+
+
+class SQLCache:
+    """Level 1: normalized question -> generated SQL, keyed by schema version."""
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, question):
+        key = (SCHEMA_VERSION, normalize_question(question))
+        with self.lock:
+            sql = self.entries.get(key)
+            if sql is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return sql
+
+    def put(self, question, sql):
+        key = (SCHEMA_VERSION, normalize_question(question))
+        with self.lock:
+            self.entries[key] = sql
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def discard(self, question):
+        with self.lock:
+            self.entries.pop((SCHEMA_VERSION, normalize_question(question)), None)
+
+
+class ResultCache:
+    """Level 2: SQL -> rows for a short TTL, plus the summaries written for them.
+
+    Entries expire after `ttl` seconds. They also remember which tables they
+    read, so a manual POST /cache/invalidate can drop just those; no write
+    path calls it.
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # sql -> {"results", "tables", "summaries", "stored"}
+        self.lock = threading.Lock()
+        self.hits = self.misses = self.invalidated = 0
+
+    def get(self, sql):
+        with self.lock:
+            entry = self.entries.get(sql)
+            if entry and time.time() - entry["stored"] <= self.ttl:
+                self.entries.move_to_end(sql)
+                self.hits += 1
+                return entry
+            if entry:
+                del self.entries[sql]
+            self.misses += 1
+            return None
+
+    def put(self, sql, results):
+        entry = {"results": results, "tables": tables_in(sql), "summaries": {},
+                 "stored": time.time()}
+        with self.lock:
+            self.entries[sql] = entry
+            self.entries.move_to_end(sql)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, tables=None):
+        """Drop entries reading any of `tables` (all entries when None)."""
+        with self.lock:
+            stale = [sql for sql, e in self.entries.items()
+                     if tables is None or e["tables"] & set(tables)]
+            for sql in stale:
+                del self.entries[sql]
+            self.invalidated += len(stale)
+            return len(stale)
+
+
+sql_cache = SQLCache(app.config["SQL_CACHE_SIZE"])
+result_cache = ResultCache(app.config["RESULT_CACHE_SIZE"], app.config["RESULT_CACHE_TTL"])
+
+
 # ==============================
 # SAFE SQL EXECUTION
 # ==============================
 
-def execute_safe_sql(query):
-    query_upper = query.strip().upper()
+LIMIT_AT_END = re.compile(r"\bLIMIT\s+(\d+)(?:\s*,\s*(\d+)|\s+OFFSET\s+(\d+))?\s*$",
+                          re.IGNORECASE)
+AGGREGATE = re.compile(r"\b(COUNT|SUM|AVG|MIN|MAX|GROUP_CONCAT)\s*\(|\bGROUP\s+BY\b|\bDISTINCT\b",
+                       re.IGNORECASE)
+LOCKING_READ = re.compile(r"\b(FOR\s+UPDATE|FOR\s+SHARE|LOCK\s+IN\s+SHARE\s+MODE)\b",
+                          re.IGNORECASE)
+
+
+def strip_sql_comments(sql):
+    """Drop --, # and /* */ comments outside quoted strings and identifiers."""
+    out, i, quote = [], 0, None
+    while i < len(sql):
+        ch = sql[i]
+        if quote:
+            out.append(ch)
+            if ch == "\\" and quote != "`" and i + 1 < len(sql):
+                out.append(sql[i + 1])
+                i += 1
+            elif ch == quote:
+                quote = None
+        elif ch in "'\"`":
+            quote = ch
+            out.append(ch)
+        elif ch == "#" or (sql.startswith("--", i) and sql[i + 2:i + 3] in ("", " ", "\t", "\n")):
+            end = sql.find("\n", i)
+            i = len(sql) if end < 0 else end
+            continue
+        elif sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            i = len(sql) if end < 0 else end + 2
+            out.append(" ")
+            continue
+        else:
+            out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def page_window(query, offset, limit):
+    """(query without trailing LIMIT, row count, offset) for a page of `query`.
+
+    `query` must already be free of comments (see strip_sql_comments). A
+    trailing LIMIT in the query is merged with the page window, so the server
+    never produces more rows than the page needs.
+    """
+    query = query.strip().rstrip(";").strip()
+    match = LIMIT_AT_END.search(query)
+    if match is None:
+        return query + " ", limit + 1, offset
+    first, second, own_offset = match.groups()
+    if second is not None:  # LIMIT offset, count
+        own_offset, own_count = int(first), int(second)
+    else:                   # LIMIT count [OFFSET offset]
+        own_offset, own_count = int(own_offset or 0), int(first)
+    count = max(0, min(limit + 1, own_count - offset))
+    return query[:match.start()], count, own_offset + offset
+
+
+def paged_sql(query, offset, limit):
+    """SQL for rows [offset, offset + limit] (one extra row tells if more follow)."""
+    base, count, start = page_window(query, offset, limit)
+    return f"{base}LIMIT {count} OFFSET {start}"
+
+
+plan_stats = {"explained": 0, "rejected": 0, "limited": 0, "full_scans": {}}
+plan_lock = threading.Lock()
+
+
+def explain(query):
+    """Run EXPLAIN and estimate rows examined.
+
+    Tables within one SELECT are joined, so their row estimates multiply;
+    separate SELECTs (subqueries, UNION parts) add up.
+    """
+    cur = mysql.connection.cursor()
+    try:
+        cur.execute("EXPLAIN " + query)
+        names = [desc[0].lower() for desc in cur.description]
+        plan = [dict(zip(names, row)) for row in cur.fetchall()]
+    finally:
+        cur.close()
+
+    per_select = {}
+    for step in plan:
+        rows = max(int(step.get("rows") or 1), 1)
+        per_select[step.get("id")] = per_select.get(step.get("id"), 1) * rows
+    return {
+        "estimated_rows": int(sum(per_select.values())),
+        "full_scans": [step["table"] for step in plan
+                       if step.get("type") == "ALL" and step.get("table")],
+        "keys": [step["key"] for step in plan if step.get("key")],
+        # Sorting or a temporary table means every row is read before the first is returned
+        "materializes": any("filesort" in str(step.get("extra") or "").lower()
+                            or "temporary" in str(step.get("extra") or "").lower()
+                            for step in plan),
+        "steps": len(plan),
+    }
+
+
+def record_plan(query, plan, action):
+    with plan_lock:
+        plan_stats["explained"] += 1
+        if action in ("rejected", "limited"):
+            plan_stats[action] += 1
+        for table in plan["full_scans"]:
+            plan_stats["full_scans"][table] = plan_stats["full_scans"].get(table, 0) + 1
+    app.logger.info("Plan %s: ~%d rows, full scans %s, keys %s: %s", action,
+                    plan["estimated_rows"], plan["full_scans"] or "none",
+                    plan["keys"] or "none", query)
+
+
+timeout_style = None
+
+
+def with_timeout(sql):
+    """Bound execution time with the server's own per-statement limit."""
+    global timeout_style
+    ms = app.config["QUERY_TIMEOUT_MS"]
+    if not ms:
+        return sql
+    if timeout_style is None:
+        timeout_style = app.config["QUERY_TIMEOUT_STYLE"]
+        if timeout_style == "auto":
+            info = getattr(mysql.connection, "get_server_info", lambda: "")()
+            timeout_style = "mariadb" if "mariadb" in info.lower() else "mysql"
+    if timeout_style == "mariadb":
+        return f"SET STATEMENT max_statement_time={ms / 1000:g} FOR {sql}"
+    return re.sub(r"^\s*SELECT\b", f"SELECT /*+ MAX_EXECUTION_TIME({int(ms)}) */", sql,
+                  count=1, flags=re.IGNORECASE)
+
+
+def execute_safe_sql(query, offset=0, limit=None):
+    """Run a SELECT and return one page as {columns, rows, truncated, offset}.
+
+    Rows are streamed from a server-side cursor and at most `limit` are kept;
+    `truncated` says whether more rows follow.
+    """
+    # Block password column access (checked before comments are removed)
+    if "PASSWORD" in query.upper():
+        return "Error: Access to password column is restricted."
+
+    # Comments would swallow the LIMIT appended for paging
+    query = strip_sql_comments(query).strip().rstrip(";").strip()
+    query_upper = query.upper()
 
     # Allow only SELECT
     if not query_upper.startswith("SELECT"):
         return "Error: Only SELECT queries allowed."
 
-    # Block password column access
-    if "PASSWORD" in query_upper:
-        return "Error: Access to password column is restricted."
-
-    try:
-        cur = mysql.connection.cursor()
-        cur.execute(query)
+    # No locking reads: they would hold row locks and break the appended LIMIT
+    if LOCKING_READ.search(query):
+        return "Error: Locking reads (FOR UPDATE / FOR SHARE) are not allowed."
 
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in cur.fetchall()]
+    limit = min(limit or app.config["RESULT_MAX_ROWS"], app.config["RESULT_MAX_ROWS"])
 
-        cur.close()
-        return results
+    try:
+        # Check the plan before running anything expensive
+        plan = explain(query)
+        can_stop_early = not plan["materializes"] and not AGGREGATE.search(query)
+        estimated = plan["estimated_rows"]
+        if can_stop_early:
+            # Rows are streamed, so the server stops after the LIMIT + OFFSET rows
+            _, count, start = page_window(query, offset, limit)
+            estimated = min(estimated, count + start)
+        over = estimated > app.config["QUERY_ROW_BUDGET"]
+        if over:
+            if app.config["QUERY_OVER_BUDGET"] != "limit" or not can_stop_early:
+                record_plan(query, plan, "rejected")
+                return (f"Error: Query would examine about {estimated} rows "
+                        f"(budget {app.config['QUERY_ROW_BUDGET']}).")
+            limit = min(limit, app.config["QUERY_OVER_BUDGET_ROWS"])
+        record_plan(query, plan, "limited" if over else "ok")
+        sql = paged_sql(query, offset, limit)
+
+        from MySQLdb.cursors import SSCursor
+        cur = mysql.connection.cursor(SSCursor)
+        try:
+            cur.execute(with_timeout(sql))
+            columns = [desc[0] for desc in cur.description]
+            rows = [list(row) for row in cur.fetchmany(limit + 1)]
+        finally:
+            cur.close()
+
+        page = {"columns": columns, "rows": rows[:limit],
+                "truncated": len(rows) > limit, "offset": offset,
+                "estimated_rows": plan["estimated_rows"]}
+        if over:
+            page["over_budget"] = True
+            page["rewritten"] = (f"Over the row budget: rewritten to return at most "
+                                 f"{limit} rows per page")
+        return page
 
     except Exception as e:
         return f"DB Error: {str(e)}"
 
 
+result_handles = OrderedDict()  # result id -> SQL, so pages can be fetched later
+handles_lock = threading.Lock()
+
+
+def register_result(sql):
+    result_id = hashlib.sha256(sql.encode()).hexdigest()[:16]
+    with handles_lock:
+        result_handles[result_id] = sql
+        result_handles.move_to_end(result_id)
+        while len(result_handles) > app.config["RESULT_HANDLES"]:
+            result_handles.popitem(last=False)
+    return result_id
+
+
 # ==============================
 # ROUTES
 # ==============================
@@ -61,51 +421,77 @@ def index():
     return render_template('index.html')
 
 
-@app.route('/ask', methods=['POST'])
-def ask():
-    data = request.get_json()
-    user_question = data.get('question')
-
-    try:
-        # STEP 1: Generate SQL
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=f"""
+def generate_sql(question):
+    generated_sql = llm.generate(f"""
 You are a MySQL expert.
 
 Convert the user question into SQL.
 
 Database schema:
-users(id PRIMARY KEY, username, password)
-grades(user_id FOREIGN KEY references users(id), marks)
+{SCHEMA}
 
 Return ONLY SQL query.
-Question: {user_question}
-"""
-        )
+Question: {question}
+""").strip()
+    return generated_sql.replace("```sql", "").replace("```", "").strip()
 
-        generated_sql = response.text.strip()
-        generated_sql = generated_sql.replace("```sql", "").replace("```", "").strip()
 
-        # STEP 2: Execute SQL
-        db_results = execute_safe_sql(generated_sql)
-
-        # STEP 3: Human explanation
-        summary_resp = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=f"""
-User asked: {user_question}
+def summarize(question, db_results):
+    if isinstance(db_results, dict):
+        shown = db_results["rows"][:app.config["SUMMARY_MAX_ROWS"]]
+        more = db_results["truncated"] or len(shown) < len(db_results["rows"])
+        db_results = f"columns {db_results['columns']}, rows {shown}"
+        if more:
+            db_results += f" (first {len(shown)} rows only; the result has more)"
+    return llm.generate(f"""
+User asked: {question}
 
 SQL result: {db_results}
 
 Explain the answer in simple words.
-"""
-        )
+""")
+
+
+@app.route('/ask', methods=['POST'])
+def ask():
+    data = request.get_json()
+    user_question = data.get('question')
+    cache = {"sql": "hit", "results": "hit"}
+
+    try:
+        # STEP 1: Generate SQL (or reuse it for a question we have seen)
+        generated_sql = sql_cache.get(user_question)
+        if generated_sql is None:
+            cache["sql"] = "miss"
+            generated_sql = generate_sql(user_question)
+            sql_cache.put(user_question, generated_sql)
+
+        # STEP 2: Execute SQL (or reuse recent rows)
+        entry = result_cache.get(generated_sql)
+        if entry is None:
+            cache["results"] = "miss"
+            db_results = execute_safe_sql(generated_sql)
+            if isinstance(db_results, str):
+                # Don't keep SQL that failed; the next ask regenerates it
+                sql_cache.discard(user_question)
+                entry = {"results": db_results, "summaries": {}}
+            else:
+                entry = result_cache.put(generated_sql, db_results)
+        db_results = entry["results"]
+
+        # STEP 3: Human explanation, reused while the rows are cached
+        key = normalize_question(user_question)
+        summary = entry["summaries"].get(key)
+        if summary is None:
+            summary = summarize(user_question, db_results)
+            entry["summaries"][key] = summary
 
         return jsonify({
             "sql": generated_sql,
             "results": db_results,
-            "summary": summary_resp.text
+            "result_id": register_result(generated_sql),
+            "summary": summary,
+            "cache": cache
         })
 
     except Exception as e:
@@ -113,6 +499,57 @@ Explain the answer in simple words.
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/results/<result_id>')
+def result_page(result_id):
+    """Further pages of an earlier answer: ?offset=500&limit=500."""
+    with handles_lock:
+        sql = result_handles.get(result_id)
+    if sql is None:
+        return jsonify({"error": "Unknown or expired result id"}), 404
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = max(1, request.args.get('limit', app.config["RESULT_MAX_ROWS"], type=int))
+
+    page = execute_safe_sql(sql, offset=offset, limit=limit)
+    if isinstance(page, str):
+        return jsonify({"error": page}), 400
+    return jsonify(page)
+
+
+@app.route('/plan/stats')
+def plan_statistics():
+    """Tables that keep getting full scans are the ones worth indexing."""
+    with plan_lock:
+        stats = {**plan_stats, "full_scans": dict(plan_stats["full_scans"])}
+    stats["budget"] = app.config["QUERY_ROW_BUDGET"]
+    return jsonify(stats)
+
+
+@app.route('/cache/invalidate', methods=['POST'])
+def invalidate_cache():
+    """Drop cached results now: {"tables": ["grades"]}, or {} for all.
+
+    Manual only; nothing calls this on writes, so otherwise entries live
+    until RESULT_CACHE_TTL.
+    """
+    token = app.config["CACHE_INVALIDATE_TOKEN"]
+    if not token or not hmac.compare_digest(request.headers.get("X-Cache-Token", ""), token):
+        return jsonify({"error": "Forbidden"}), 403
+    tables = (request.get_json(silent=True) or {}).get('tables')
+    return jsonify({"dropped": result_cache.invalidate(tables)})
+
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify({
+        "schema_version": SCHEMA_VERSION,
+        "sql": {"entries": len(sql_cache.entries), "hits": sql_cache.hits,
+                "misses": sql_cache.misses},
+        "results": {"entries": len(result_cache.entries), "hits": result_cache.hits,
+                    "misses": result_cache.misses, "invalidated": result_cache.invalidated,
+                    "ttl": result_cache.ttl}
+    })
+
+
 # ==============================
 # RUN SERVER
 # ==============================